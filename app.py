@@ -2,11 +2,14 @@ from flask import Flask
 from routes.routes import routes
 from config import SECRET_KEY
 from flask import Flask, flash, session
+from models.db import init_app as init_db
+from commands import register_commands
 
 app = Flask(__name__)
 app.secret_key = SECRET_KEY
 app.register_blueprint(routes)
+init_db(app)
+register_commands(app)
 
 if __name__ == "__main__":
     app.run(debug=True, port=5003)
-
@@ -0,0 +1,116 @@
+"""
+Campaign pipeline benchmark (no browser).
+
+Seeds synthetic orders, then times the parts of a WhatsApp campaign that run
+on our side: recipient selection and dedup, message rendering, and a full
+run_campaign() with the stub transport (checkpoints, batched post-send updates,
+counters). The orders table is replaced, so point DB_NAME at a scratch database:
+
+    python -m benchmarks.bench_campaigns --seed 100000 --type confirmation --lanes 4
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from models.db import pooled_connection
+from models.message_templates import store as template_store
+from models import customers
+from models import phones
+from models import stats
+from whatsapp import campaigns
+from whatsapp.transports import StubTransport, set_transport
+
+# order rows each type selects
+SEED_VALUES = {
+    'confirmation': {'status': 'To Process'},
+    'return': {'shipping_status': 'Failed Delivery'},
+    'cancelled': {'status': 'Cancelled'},
+    'valued': {'customer_type': 'Valued'},
+    'tracking': {'shipping_status': 'Shipped', 'tracking_number': 'TRK'},
+}
+
+
+def seed(conn, n, message_type, batch=5000):
+    """
+    Replace orders with `n` rows matched by `message_type`; ~1.3 line items per
+    order. The rows bypass the order write path, so the summary tables, the
+    customers rollup and the orders version are rebuilt afterwards.
+    """
+    values = SEED_VALUES[message_type]
+    start = datetime.now() - timedelta(days=60)
+    with conn.cursor() as c:
+        c.execute("DELETE FROM orders")
+        conn.commit()
+        order = 0
+        for i in range(0, n, batch):
+            rows = []
+            for j in range(i, min(i + batch, n)):
+                if random.random() < 0.77:
+                    order += 1
+                phone = f'0300{order % (n // 2 + 1):07d}'
+                rows.append((
+                    'Shopify', f'#Q{order}', f'Product {j}', 1200.0,
+                    start + timedelta(minutes=random.randint(0, 60 * 24 * 60)),
+                    f'Customer {order}', phone, phones.normalize(phone), 'City',
+                    values.get('status', 'Pending'), values.get('shipping_status', ''),
+                    values.get('customer_type', ''), values.get('tracking_number', ''),
+                ))
+            c.executemany("""
+                INSERT INTO orders (order_source, order_number, item_name, total, created_at,
+                    billing_name, billing_phone, phone_e164, billing_city, status, shipping_status,
+                    customer_type, tracking_number)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, rows)
+            conn.commit()
+        c.execute("DELETE FROM campaign_suppressions WHERE message_type = %s", (message_type,))
+        stats.touch(c)
+    conn.commit()
+    stats.rebuild(conn)
+    customers.rebuild(conn)
+
+
+def timed(label, fn, count=None):
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    rate = f"{count / elapsed:12.0f} recipients/s" if count and elapsed else ""
+    print(f"{label:<28} {elapsed * 1000:10.1f} ms  {rate}")
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--seed', type=int, default=100000, help='order rows to generate (0: keep the table)')
+    ap.add_argument('--type', default='confirmation', choices=sorted(campaigns.MESSAGE_TYPES))
+    ap.add_argument('--lanes', type=int, default=1, help='parallel stub lanes')
+    ap.add_argument('--out', default='', help='also write every message to this NDJSON file')
+    args = ap.parse_args()
+
+    with pooled_connection() as conn:
+        if args.seed:
+            seed(conn, args.seed, args.type)
+        spec = campaigns.MESSAGE_TYPES[args.type]
+
+        def select():
+            with conn.cursor() as c:
+                c.execute(campaigns.RECIPIENTS_SQL.format(where=spec.where), (args.type,))
+                return campaigns.unique_recipients(c.fetchall(), spec.per_order)
+
+        users = timed('select + dedup', select)
+        print(f"recipients: {len(users)}")
+        renderer = template_store.renderer(args.type)
+        timed('render', lambda: renderer.render_many(users), len(users))
+
+        stub = StubTransport(path=args.out, lanes=args.lanes)
+        set_transport(stub)
+        campaign_id = campaigns.create_campaign(conn, args.type)
+        timed(f'run_campaign (stub x{args.lanes})', lambda: campaigns.run_campaign(campaign_id), len(users))
+        stub.close()
+        campaign = campaigns.get_campaign(conn, campaign_id)
+        print(f"campaign {campaign_id}: status={campaign['status']} sent={campaign['sent']} "
+              f"failed={campaign['failed']} recorded={stub.count}")
+
+
+if __name__ == '__main__':
+    main()
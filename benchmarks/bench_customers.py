@@ -0,0 +1,179 @@
+"""
+Customers query benchmark.
+
+Compares the three ways the customers list has been derived from orders:
+
+  legacy      CASE phone/'NAME:' key computed per row plus three correlated
+              subqueries per group (nothing can use an index)
+  window      ROW_NUMBER() over customer_key joined to a GROUP BY pass
+  latest-row  GROUP BY on the indexed customer_key joined to the latest order
+              per key (models.customers.SOURCE_SQL)
+
+at several table sizes. Each size is seeded into a truncated orders table, so
+point DB_NAME at a scratch database:
+
+    python -m benchmarks.bench_customers --sizes 10000,100000,1000000 --runs 3
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from models.db import pooled_connection
+from models import customers
+
+CITIES = [f'City {i}' for i in range(1, 41)]
+TYPES = ['', '', '', 'Valued']
+COURIERS = ['', 'Leopards', 'TCS', 'PostEx']
+
+LEGACY_SQL = """
+  SELECT
+    cust_key,
+    MAX(billing_name)                        AS billing_name,
+    MAX(NULLIF(billing_phone,''))            AS billing_phone,
+    COUNT(*)                                 AS total_orders,
+    COALESCE(SUM(total),0)                   AS total_spent,
+    MIN(COALESCE(created_at, NOW()))         AS first_order,
+    MAX(COALESCE(created_at, NOW()))         AS last_order,
+    (
+      SELECT o2.billing_city FROM orders o2
+      WHERE (CASE WHEN o2.billing_phone IS NOT NULL AND o2.billing_phone<>''
+                  THEN o2.billing_phone ELSE CONCAT('NAME:', o2.billing_name) END) = cust_key
+      ORDER BY COALESCE(o2.created_at, NOW()) DESC, o2.id DESC
+      LIMIT 1
+    ) AS billing_city,
+    (
+      SELECT o2.customer_type FROM orders o2
+      WHERE (CASE WHEN o2.billing_phone IS NOT NULL AND o2.billing_phone<>''
+                  THEN o2.billing_phone ELSE CONCAT('NAME:', o2.billing_name) END) = cust_key
+      ORDER BY COALESCE(o2.created_at, NOW()) DESC, o2.id DESC
+      LIMIT 1
+    ) AS customer_type,
+    (
+      SELECT o2.preferred_courier FROM orders o2
+      WHERE (CASE WHEN o2.billing_phone IS NOT NULL AND o2.billing_phone<>''
+                  THEN o2.billing_phone ELSE CONCAT('NAME:', o2.billing_name) END) = cust_key
+      ORDER BY COALESCE(o2.created_at, NOW()) DESC, o2.id DESC
+      LIMIT 1
+    ) AS preferred_courier
+  FROM (
+    SELECT
+      CASE WHEN billing_phone IS NOT NULL AND billing_phone<>''
+           THEN billing_phone ELSE CONCAT('NAME:', billing_name) END AS cust_key,
+      billing_name, billing_phone, total, created_at
+    FROM orders
+  ) t
+  GROUP BY cust_key
+"""
+
+WINDOW_SQL = """
+    WITH base AS (
+        SELECT
+            id, customer_key, billing_name, billing_phone, billing_city, billing_street,
+            preferred_courier, customer_type,
+            ROW_NUMBER() OVER (PARTITION BY customer_key ORDER BY created_at DESC, id DESC) AS rn
+        FROM orders
+    ),
+    agg AS (
+        SELECT
+            customer_key,
+            COUNT(*)                 AS orders_count,
+            COALESCE(SUM(total), 0)  AS total_spent,
+            MIN(created_at)          AS joined_at,
+            MAX(created_at)          AS last_order_at
+        FROM orders
+        GROUP BY customer_key
+    )
+    SELECT
+        l.customer_key, l.billing_name, l.billing_phone, l.billing_city, l.billing_street,
+        l.preferred_courier, l.customer_type,
+        a.orders_count, a.total_spent, a.joined_at, a.last_order_at
+    FROM base l
+    JOIN agg a USING (customer_key)
+    WHERE l.rn = 1
+"""
+
+VARIANTS = [
+    ('legacy (correlated)', LEGACY_SQL),
+    ('window (ROW_NUMBER)', WINDOW_SQL),
+    ('latest-row join', customers.SOURCE_SQL.format(where='')),
+]
+
+
+def seed(conn, n, batch=5000):
+    """Replace orders with `n` synthetic rows over ~n/4 customers, 5% without a phone."""
+    start = datetime.now() - timedelta(days=730)
+    n_customers = max(n // 4, 1)
+    with conn.cursor() as c:
+        c.execute("DELETE FROM orders")
+        conn.commit()
+        for i in range(0, n, batch):
+            rows = []
+            for j in range(i, min(i + batch, n)):
+                cust = random.randint(1, n_customers)
+                phone = '' if cust % 20 == 0 else f'0300{cust:07d}'
+                rows.append((
+                    'Shopify', f'#C{j}', f'Product {random.randint(1, 200)}', 1200.0,
+                    start + timedelta(minutes=random.randint(0, 730 * 24 * 60)),
+                    f'Customer {cust}', phone, CITIES[cust % len(CITIES)],
+                    random.choice(TYPES), random.choice(COURIERS),
+                ))
+            c.executemany("""
+                INSERT INTO orders (order_source, order_number, item_name, total, created_at,
+                    billing_name, billing_phone, billing_city, customer_type, preferred_courier)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, rows)
+            conn.commit()
+        c.execute("ANALYZE TABLE orders")
+        c.fetchall()
+
+
+def explain(conn, sql):
+    with conn.cursor() as c:
+        c.execute("EXPLAIN " + sql)
+        for r in c.fetchall():
+            print(f"    {r.get('select_type', ''):<20} {str(r.get('table')):<12} "
+                  f"type={str(r.get('type')):<8} key={str(r.get('key')):<28} rows={r.get('rows')}")
+
+
+def timed(label, conn, sql, runs, timeout):
+    samples, rows = [], 0
+    with conn.cursor() as c:
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            try:
+                c.execute(sql)
+            except Exception as e:
+                print(f"  {label:<22} gave up: {e}")
+                return
+            rows = len(c.fetchall())
+            samples.append(time.perf_counter() - t0)
+            if samples[-1] > timeout:
+                break
+    samples.sort()
+    print(f"  {label:<22} customers={rows:<8} runs={len(samples):<3} "
+          f"median={samples[len(samples) // 2] * 1000:10.1f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--sizes', default='10000,100000,1000000', help='comma-separated order counts to seed')
+    ap.add_argument('--runs', type=int, default=3)
+    ap.add_argument('--timeout', type=float, default=300,
+                    help='stop repeating a variant once one run takes longer than this many seconds')
+    ap.add_argument('--explain', action='store_true', help='print EXPLAIN for each variant')
+    args = ap.parse_args()
+
+    with pooled_connection() as conn:
+        for n in [int(s) for s in args.sizes.split(',') if s]:
+            seed(conn, n)
+            print(f"orders: {n}")
+            for label, sql in VARIANTS:
+                if args.explain:
+                    print(f"  {label}:")
+                    explain(conn, sql)
+                timed(label, conn, sql, args.runs, args.timeout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Dashboard aggregate benchmark.
+
+Compares the old dashboard queries (per-status COUNT(*) and GROUP BY scans of
+orders, copied below) with models.stats reading the order_stats_* summary
+tables, and the cached path used between page loads. Point DB_NAME at a scratch
+database and use --seed to generate orders (the summary tables are rebuilt after):
+
+    python -m benchmarks.bench_dashboard --seed 200000 --runs 20
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from models.db import pooled_connection
+from models import stats
+
+STATUSES = ['Confirmed', 'Cancelled', 'Pending', 'Not Responding', 'To Process']
+SHIPPING = ['', 'Shipped', 'Delivered', 'Failed Delivery', 'Returned']
+
+LEGACY_QUERIES = [
+    "SELECT COUNT(*) AS total FROM orders",
+    "SELECT COUNT(*) AS confirmed FROM orders WHERE status = 'Confirmed'",
+    "SELECT COUNT(*) AS cancelled FROM orders WHERE status = 'Cancelled'",
+    "SELECT COUNT(*) AS pending FROM orders WHERE status = 'Pending'",
+    "SELECT COUNT(*) AS not_responding FROM orders WHERE status = 'Not Responding'",
+    "SELECT COUNT(*) AS to_process FROM orders WHERE status = 'To Process'",
+    "SELECT COUNT(*) AS failed_delivery FROM orders WHERE shipping_status = 'Failed Delivery'",
+    "SELECT COUNT(*) AS valued FROM orders WHERE customer_type = 'Valued'",
+    """
+    SELECT item_name, COUNT(*) AS cnt
+    FROM orders
+    WHERE item_name <> '' AND item_name IS NOT NULL
+    GROUP BY item_name
+    ORDER BY cnt DESC
+    LIMIT 5
+    """,
+    """
+    SELECT DATE_FORMAT(created_at, '%Y-%m') AS ym, COUNT(*) AS cnt
+    FROM orders
+    WHERE created_at IS NOT NULL
+    GROUP BY ym
+    ORDER BY ym ASC
+    """,
+]
+
+
+def seed(conn, n, batch=5000):
+    start = datetime.now() - timedelta(days=730)
+    with conn.cursor() as c:
+        for i in range(0, n, batch):
+            rows = []
+            for j in range(i, min(i + batch, n)):
+                rows.append((
+                    'Shopify', f'#B{j}', 1000.0, 200.0, 1200.0,
+                    start + timedelta(minutes=random.randint(0, 730 * 24 * 60)),
+                    1, f'Product {random.randint(1, 200)}', f'Customer {j % 50000}',
+                    f'0300{random.randint(1000000, 9999999)}', f'City {random.randint(1, 40)}',
+                    random.choice(STATUSES), random.choice(SHIPPING),
+                    'Valued' if random.random() < 0.05 else '',
+                ))
+            c.executemany("""
+                INSERT INTO orders (order_source, order_number, subtotal, shipping, total, created_at,
+                    quantity, item_name, billing_name, billing_phone, billing_city, status,
+                    shipping_status, customer_type)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, rows)
+            conn.commit()
+
+
+def legacy(conn):
+    with conn.cursor() as c:
+        for sql in LEGACY_QUERIES:
+            c.execute(sql)
+            c.fetchall()
+
+
+def timed(label, fn, runs, queries):
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    print(f"{label:<28} queries/page={queries:<5} "
+          f"median={samples[len(samples) // 2] * 1000:9.2f} ms  "
+          f"p95={samples[int(len(samples) * 0.95) - 1] * 1000:9.2f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--seed', type=int, default=0, help='insert this many synthetic orders first')
+    ap.add_argument('--runs', type=int, default=10)
+    args = ap.parse_args()
+
+    with pooled_connection() as conn:
+        if args.seed:
+            seed(conn, args.seed)
+            # seed() writes orders directly; the dashboard reads the summary tables
+            stats.rebuild(conn)
+        with conn.cursor() as c:
+            c.execute("SELECT COUNT(*) AS n FROM orders")
+            print(f"orders: {c.fetchone()['n']}")
+
+        timed('legacy (per-status scans)', lambda: legacy(conn), args.runs, len(LEGACY_QUERIES))
+        timed('summary tables', lambda: stats._compute_dashboard(conn), args.runs, 3)
+        stats.invalidate()
+        timed('summary tables + cache', lambda: stats.dashboard_summary(conn), args.runs, '3/0')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Message rendering microbenchmark (no database, no browser).
+
+Compares the per-call f-string/str.format rendering campaigns used to do
+(legacy() below, the 'confirmation' branch of the old sender.build_message) with
+the compiled renderer (models/renderer.py), one message at a time and through
+render_many():
+
+    python -m benchmarks.bench_render --count 200000 --repeat 5
+    python -m benchmarks.bench_render --db --type tracking   # layouts and templates from message_templates
+"""
+import argparse
+import random
+import time
+
+from models.renderer import compile_type
+
+# the seeded 'confirmation' layout and a few of its template lines (schema.sql)
+PARTS = ["{@greetings|Hi}, *{name}*,", "{@intros|Thank you for your order}", "{@order_lines|Your order: {product}}",
+         "{@confirmation_requests|Please confirm}", "{@closings|Best regards}"]
+TEMPLATES = {
+    'greetings': ["Assalam o Alaikum", "Salam", "Hello", "Hi there", "Dear Customer"],
+    'intros': ["We are reaching out from Mihraaj Ventures.", "This is a follow-up from Mihraaj Ventures."],
+    'order_lines': ["We received your order for {product} (#{order_num}). Total: PKR {price}.",
+                    "Your order #{order_num} of {product} has been placed. Amount due: PKR {price}."],
+    'confirmation_requests': ["Please confirm your order so we can proceed.", "Kindly order ki tasdeeq kar dein."],
+    'closings': ["Shukriya.", "Thanks from Mihraaj Ventures!", "Stay safe and thank you!"],
+}
+
+
+def legacy(user, templates):
+    name, product, order_num, price = (user['billing_name'] or 'Customer', user['item_name'] or 'your product',
+                                       user['order_number'], user['total'])
+    return (
+        f"{random.choice(templates.get('greetings', ['Hi']))}, *{name or 'Customer'}*,\n\n"
+        f"{random.choice(templates.get('intros', ['Thank you for your order']))}\n\n"
+        f"{random.choice(templates.get('order_lines', ['Your order: {product}'])).format(product=product, order_num=order_num, price=price)}\n\n"
+        f"{random.choice(templates.get('confirmation_requests', ['Please confirm']))}\n\n"
+        f"{random.choice(templates.get('closings', ['Best regards']))}"
+    )
+
+
+def recipients(n):
+    return [{'billing_name': f'Customer {i}', 'item_name': f'Product {i % 500}', 'order_number': f'#Q{i}',
+             'total': 1200.0 + i % 7, 'tracking_number': f'TRK{i}'} for i in range(n)]
+
+
+def timed(label, fn, count, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    print(f"{label:<24} {best * 1000:10.1f} ms  {count / best:12.0f} messages/s")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--count', type=int, default=100000, help='messages to render per variant')
+    ap.add_argument('--db', action='store_true', help='use the message_templates table instead of the sample')
+    ap.add_argument('--type', default='confirmation', help='message type to render with --db')
+    ap.add_argument('--repeat', type=int, default=3, help='runs per variant; the fastest is reported')
+    args = ap.parse_args()
+
+    users = recipients(args.count)
+    if args.db:
+        from models.message_templates import store
+        renderer = store.renderer(args.type)
+    else:
+        templates = TEMPLATES
+        renderer = compile_type('confirmation', PARTS, templates)
+        timed('legacy build_message', lambda: [legacy(u, templates) for u in users], len(users), args.repeat)
+    timed('compiled render', lambda: [renderer.render(u) for u in users], len(users), args.repeat)
+    timed('compiled render_many', lambda: renderer.render_many(users), len(users), args.repeat)
+    print()
+    print(renderer.render(users[0]))
+
+
+if __name__ == '__main__':
+    main()
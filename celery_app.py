@@ -0,0 +1,15 @@
+from celery import Celery
+
+from config import CELERY_BROKER_URL, CELERY_ALWAYS_EAGER
+
+# Worker: celery -A celery_app worker --concurrency 1
+# Progress lives in the campaigns table, so task results are not stored.
+celery = Celery('orders', broker=CELERY_BROKER_URL, include=['whatsapp.campaigns'])
+celery.conf.update(
+    task_ignore_result=True,
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+    # CELERY_ALWAYS_EAGER=1 runs tasks in-process on .delay(): no broker or worker needed
+    task_always_eager=CELERY_ALWAYS_EAGER,
+    task_eager_propagates=True,
+)
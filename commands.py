@@ -0,0 +1,97 @@
+import click
+
+from models.db import pooled_connection
+from models import stats
+from models import customers
+from models import phones
+from models import message_templates
+from models import importer
+
+BACKFILL_BATCH = 5000
+
+
+def register_commands(app):
+    @app.cli.command('rebuild-order-stats')
+    def rebuild_order_stats():
+        """Recompute the order_stats_* summary tables from orders."""
+        with pooled_connection() as conn:
+            stats.rebuild(conn)
+        click.echo("Order stats rebuilt")
+
+    @app.cli.command('rebuild-customers')
+    def rebuild_customers():
+        """Recompute the customers rollup table from orders."""
+        with pooled_connection() as conn:
+            customers.rebuild(conn)
+        click.echo("Customers rebuilt")
+
+    @app.cli.command('backfill-phones')
+    @click.option('--all', 'redo', is_flag=True, help='Recompute rows that already have phone_e164.')
+    def backfill_phones(redo):
+        """Fill orders.phone_e164 from billing_phone in id batches, then rebuild customers."""
+        only_missing = "" if redo else "AND phone_e164 IS NULL"
+        updated, last_id = 0, 0
+        with pooled_connection() as conn:
+            while True:
+                with conn.cursor() as c:
+                    c.execute(f"""
+                        SELECT id, billing_phone, phone_e164 FROM orders
+                        WHERE id > %s {only_missing}
+                        ORDER BY id LIMIT %s
+                    """, (last_id, BACKFILL_BATCH))
+                    rows = c.fetchall()
+                    if not rows:
+                        break
+                    last_id = rows[-1]['id']
+                    changes = [(e164, r['id']) for r in rows
+                               if (e164 := phones.normalize(r['billing_phone'])) != r['phone_e164']]
+                    if changes:
+                        c.executemany("UPDATE orders SET phone_e164 = %s WHERE id = %s", changes)
+                        updated += len(changes)
+                conn.commit()
+            with conn.cursor() as c:
+                stats.touch(c)
+            conn.commit()
+            stats.invalidate()
+            customers.rebuild(conn)
+        click.echo(f"Normalized {updated} phone numbers; customers rebuilt")
+
+    @app.cli.command('summarize-templates')
+    def summarize_templates():
+        """Store preview_text, lines_count and chars_count for every message template."""
+        with pooled_connection() as conn:
+            with conn.cursor() as c:
+                c.execute("SELECT id, content FROM message_templates")
+                rows = c.fetchall()
+                c.executemany("""
+                    UPDATE message_templates SET preview_text = %s, lines_count = %s, chars_count = %s
+                    WHERE id = %s
+                """, [(*message_templates.summarize(r['content']), r['id']) for r in rows])
+            conn.commit()
+        click.echo(f"Summarized {len(rows)} templates")
+
+    @app.cli.command('fail-stale-imports')
+    def fail_stale_imports():
+        """Mark imports that stopped committing batches (server restarted mid-file) as failed."""
+        with pooled_connection() as conn:
+            failed = importer.fail_stale_jobs(conn)
+        click.echo(f"Marked {failed} interrupted imports as failed")
+
+    @app.cli.command('dedupe-orders')
+    @click.confirmation_option(prompt='Delete duplicate order lines (keeping the oldest of each)?')
+    def dedupe_orders():
+        """Remove repeated (source, order number, line item) rows so uq_orders_line can be added."""
+        with pooled_connection() as conn:
+            with conn.cursor() as c:
+                deleted = c.execute("""
+                    DELETE o FROM orders o
+                    JOIN orders keep
+                      ON keep.order_source <=> o.order_source
+                     AND keep.order_number <=> o.order_number
+                     AND keep.item_name    <=> o.item_name
+                     AND keep.id < o.id
+                """)
+            conn.commit()
+            stats.rebuild(conn)
+            customers.rebuild(conn)
+        click.echo(f"Deleted {deleted} duplicate order lines")
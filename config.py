@@ -11,5 +11,66 @@ DB_CONFIG = {
     'cursorclass': 'DictCursor'
 }
 
-SECRET_KEY = os.getenv('SECRET_KEY')
+# Connection pool sizing (seconds for the time-based settings)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 3600))
+DB_POOL_PING_AFTER = int(os.getenv('DB_POOL_PING_AFTER', 30))
+
+# Seconds the dashboard counters and charts are served from memory
+DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', 30))
+# Seconds the /customers summary cards are served from memory
+CUSTOMER_CARDS_CACHE_TTL = int(os.getenv('CUSTOMER_CARDS_CACHE_TTL', 60))
+# Seconds a search result total is reused by /orders?count=cached
+ORDERS_COUNT_CACHE_TTL = int(os.getenv('ORDERS_COUNT_CACHE_TTL', 60))
+
+# Rows per INSERT/commit when streaming a CSV import
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 500))
+# Seconds without a batch commit before a queued/running import is marked failed
+IMPORT_STALE_AFTER = int(os.getenv('IMPORT_STALE_AFTER', 300))
+
+# WhatsApp campaigns run on a Celery worker (celery_app.py)
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+# Run campaign tasks inside the web process instead of on a worker (local dev / tests)
+CELERY_ALWAYS_EAGER = os.getenv('CELERY_ALWAYS_EAGER', '0').lower() in ('1', 'true', 'yes')
+
+# Chrome profile holding the logged-in WhatsApp Web session, and how long to wait
+# for it to load (covers scanning the QR code on first run)
+WHATSAPP_PROFILE_DIR = os.getenv('WHATSAPP_PROFILE_DIR', './whatsapp_session')
+WHATSAPP_READY_TIMEOUT = int(os.getenv('WHATSAPP_READY_TIMEOUT', 60))
+# Extra logged-in profiles (comma-separated directories, one WhatsApp account each);
+# campaigns spread recipients across WHATSAPP_PROFILE_DIR and all of these
+WHATSAPP_EXTRA_PROFILE_DIRS = [d.strip() for d in os.getenv('WHATSAPP_EXTRA_PROFILE_DIRS', '').split(',') if d.strip()]
+# Messages per minute per profile, and how many may go back to back after a pause
+WHATSAPP_RATE_PER_MIN = float(os.getenv('WHATSAPP_RATE_PER_MIN', 4))
+WHATSAPP_RATE_BURST = int(os.getenv('WHATSAPP_RATE_BURST', 1))
+# How campaign messages go out: 'selenium' (WhatsApp Web profiles above), 'http'
+# (POST to WHATSAPP_API_URL) or 'stub' (recorded to WHATSAPP_STUB_FILE, nothing sent)
+WHATSAPP_TRANSPORT = os.getenv('WHATSAPP_TRANSPORT', 'selenium')
+WHATSAPP_API_URL = os.getenv('WHATSAPP_API_URL', '')
+WHATSAPP_API_TOKEN = os.getenv('WHATSAPP_API_TOKEN', '')
+WHATSAPP_API_LANES = int(os.getenv('WHATSAPP_API_LANES', 1))
+WHATSAPP_STUB_FILE = os.getenv('WHATSAPP_STUB_FILE', '')
+
+# Campaign results (sent counts, post-send order updates, errors) are written in
+# batches of this many recipients, or at least every CAMPAIGN_FLUSH_INTERVAL seconds
+CAMPAIGN_FLUSH_SIZE = int(os.getenv('CAMPAIGN_FLUSH_SIZE', 50))
+CAMPAIGN_FLUSH_INTERVAL = float(os.getenv('CAMPAIGN_FLUSH_INTERVAL', 15))
 
+# Sends tried per recipient (first run plus resumes) before it is left as failed
+CAMPAIGN_MAX_ATTEMPTS = int(os.getenv('CAMPAIGN_MAX_ATTEMPTS', 3))
+
+# A 'running' campaign whose worker has not flushed for this many seconds is taken
+# for dead and may be resumed
+CAMPAIGN_STALE_AFTER = int(os.getenv('CAMPAIGN_STALE_AFTER', 600))
+
+# Days before a customer-level promo (valued, cancelled) can go to the same customer again
+CAMPAIGN_COOLDOWN_DAYS = int(os.getenv('CAMPAIGN_COOLDOWN_DAYS', 7))
+
+# Seconds between checks of the template version by a running campaign
+TEMPLATE_VERSION_CHECK = int(os.getenv('TEMPLATE_VERSION_CHECK', 10))
+
+# Country code assumed for phone numbers written without one (orders.phone_e164)
+PHONE_DEFAULT_COUNTRY = os.getenv('PHONE_DEFAULT_COUNTRY', '92')
+
+SECRET_KEY = os.getenv('SECRET_KEY')
@@ -0,0 +1,48 @@
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+
+class LatencyStats:
+    """
+    Per-label latency counters (count, avg, max and p50/p95 over the most recent
+    `window` samples). Cheap enough to call on every request.
+    """
+
+    def __init__(self, window=500):
+        self.window = window
+        self._lock = threading.Lock()
+        self._count = defaultdict(int)
+        self._total = defaultdict(float)
+        self._max = defaultdict(float)
+        self._recent = defaultdict(lambda: deque(maxlen=self.window))
+
+    def observe(self, label, seconds):
+        with self._lock:
+            self._count[label] += 1
+            self._total[label] += seconds
+            self._max[label] = max(self._max[label], seconds)
+            self._recent[label].append(seconds)
+
+    @contextmanager
+    def timer(self, label):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(label, time.perf_counter() - started)
+
+    def snapshot(self):
+        out = {}
+        with self._lock:
+            for label, count in self._count.items():
+                recent = sorted(self._recent[label])
+                out[label] = {
+                    'count': count,
+                    'avg_ms': round(self._total[label] / count * 1000, 2),
+                    'max_ms': round(self._max[label] * 1000, 2),
+                    'p50_ms': round(recent[len(recent) // 2] * 1000, 2),
+                    'p95_ms': round(recent[max(int(len(recent) * 0.95) - 1, 0)] * 1000, 2),
+                }
+        return out
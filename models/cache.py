@@ -0,0 +1,46 @@
+import threading
+import time
+
+
+class TTLCache:
+    """
+    Small in-process cache with a per-entry time-to-live.
+
+    Values are recomputed by `get_or_set` when missing or expired; `clear()` is
+    called from the write paths so readers never see data older than one write.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def get_or_set(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._data), 'ttl': self.ttl}
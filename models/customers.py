@@ -0,0 +1,119 @@
+from config import CUSTOMER_CARDS_CACHE_TTL
+from models.cache import TTLCache
+from models import phones
+
+# Summary cards on /customers; cleared by stats.invalidate() after order writes
+cards_cache = TTLCache(CUSTOMER_CARDS_CACHE_TTL)
+
+COLUMNS = (
+    'customer_key', 'billing_name', 'billing_phone', 'billing_city', 'billing_street',
+    'preferred_courier', 'customer_type', 'orders_count', 'total_spent', 'joined_at', 'last_order_at',
+)
+
+# One row per customer_key from orders: aggregates grouped on the indexed key,
+# joined to the latest order of each key for its contact fields. The latest row
+# is the one at MAX(created_at) with no newer id at the same timestamp; both
+# joins are ref lookups on idx_orders_key_created_id (no window, no correlated
+# subquery). `{where}` narrows the aggregate to the keys being refreshed.
+SOURCE_SQL = """
+    SELECT
+        l.customer_key, l.billing_name, l.billing_phone, l.billing_city, l.billing_street,
+        l.preferred_courier, l.customer_type,
+        a.orders_count, a.total_spent, a.joined_at, a.last_order_at
+    FROM (
+        SELECT
+            customer_key,
+            COUNT(*)                 AS orders_count,
+            COALESCE(SUM(total), 0)  AS total_spent,
+            MIN(created_at)          AS joined_at,
+            MAX(created_at)          AS last_order_at
+        FROM orders
+        {where}
+        GROUP BY customer_key
+    ) a
+    JOIN orders l
+      ON l.customer_key = a.customer_key AND l.created_at <=> a.last_order_at
+    LEFT JOIN orders newer
+      ON newer.customer_key = l.customer_key AND newer.created_at <=> l.created_at AND newer.id > l.id
+    WHERE newer.id IS NULL
+"""
+
+UPSERT_SQL = (
+    f"INSERT INTO customers ({', '.join(COLUMNS)}) SELECT * FROM ({SOURCE_SQL}) AS src"
+    " ON DUPLICATE KEY UPDATE "
+    + ", ".join(f"{c} = VALUES({c})" for c in COLUMNS[1:])
+)
+
+REFRESH_CHUNK = 500
+
+CARDS_SQL = """
+    SELECT
+        COUNT(*)                                                              AS total,
+        COALESCE(SUM(customer_type = 'Valued'), 0)                            AS valued,
+        COALESCE(SUM(joined_at >= DATE_FORMAT(CURDATE(), '%Y-%m-01')), 0)     AS new_month,
+        COALESCE(SUM(last_order_at < (NOW() - INTERVAL 30 DAY)), 0)           AS inactive30
+    FROM customers
+"""
+
+
+def _compute_cards(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(CARDS_SQL)
+        return {k: int(v or 0) for k, v in cursor.fetchone().items()}
+
+
+def summary_cards(conn):
+    """Total / valued / new this month / inactive 30 days, one pass, cached for CUSTOMER_CARDS_CACHE_TTL seconds."""
+    return cards_cache.get_or_set('cards', lambda: _compute_cards(conn))
+
+
+def key_for(billing_phone, billing_name, billing_city):
+    """customer_key of a row that has not been written yet; must match the orders.customer_key expression."""
+    phone = phones.normalize(billing_phone) or (billing_phone or '').strip(' ')
+    if phone:
+        return phone
+    return f"N:{(billing_name or '').strip(' ')}|C:{(billing_city or '').strip(' ')}"
+
+
+def keys(*snapshots):
+    """customer_keys touched by one or more `stats.snapshot()` results."""
+    return {r['customer_key'] for rows in snapshots for r in rows if r.get('customer_key') is not None}
+
+
+def refresh(cursor, customer_keys):
+    """
+    Recompute the customers rows for `customer_keys` from orders, dropping keys
+    that no longer have any orders. Runs on the caller's cursor so it commits
+    with the order write itself; each key costs an index range on
+    idx_orders_key_created_id.
+    """
+    customer_keys = sorted(set(customer_keys))
+    for i in range(0, len(customer_keys), REFRESH_CHUNK):
+        chunk = customer_keys[i:i + REFRESH_CHUNK]
+        in_list = ", ".join(["%s"] * len(chunk))
+        where = f"WHERE customer_key IN ({in_list})"
+        cursor.execute(UPSERT_SQL.format(where=where), chunk)
+        cursor.execute(f"""
+            DELETE FROM customers
+            WHERE customer_key IN ({in_list})
+              AND NOT EXISTS (SELECT 1 FROM orders o WHERE o.customer_key = customers.customer_key)
+        """, chunk)
+
+
+def refresh_where(cursor, where_sql, params=()):
+    """Refresh the customers of the orders matched by `where_sql` (after the write)."""
+    cursor.execute(f"SELECT DISTINCT customer_key FROM orders {where_sql}", params)
+    refresh(cursor, [r['customer_key'] for r in cursor.fetchall()])
+
+
+def clear(cursor):
+    cursor.execute("DELETE FROM customers")
+
+
+def rebuild(conn):
+    """Recompute the whole customers table from orders in one transaction."""
+    with conn.cursor() as cursor:
+        clear(cursor)
+        cursor.execute(UPSERT_SQL.format(where=''))
+    conn.commit()
+    cards_cache.clear()
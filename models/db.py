@@ -1,11 +1,215 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
 import pymysql
-from config import DB_CONFIG
+from flask import g, has_app_context
+from config import DB_CONFIG, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PING_AFTER
 
-def get_connection():
+
+class PoolTimeout(Exception):
+    pass
+
+
+class CountingDictCursor(pymysql.cursors.DictCursor):
+    """DictCursor that counts statements run during the current request."""
+
+    def execute(self, query, args=None):
+        if has_app_context():
+            g.db_queries = g.get('db_queries', 0) + 1
+        return super().execute(query, args)
+
+
+def _connect():
     return pymysql.connect(
         host=DB_CONFIG['host'],
         user=DB_CONFIG['user'],
         password=DB_CONFIG['password'],
         database=DB_CONFIG['database'],
-        cursorclass=pymysql.cursors.DictCursor
+        cursorclass=CountingDictCursor
     )
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of PyMySQL connections.
+
+    At most `size` connections are open at once; callers block up to `timeout`
+    seconds for one to come back. Connections idle for longer than `ping_after`
+    seconds are pinged before being handed out, and connections older than
+    `recycle` seconds are closed and replaced.
+    """
+
+    def __init__(self, size, timeout, recycle, ping_after, connect=_connect):
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self._connect = connect
+        self._idle = deque()
+        self._open = 0
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'acquired': 0,
+            'created': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'timeouts': 0,
+            'recycled': 0,
+            'ping_failures': 0,
+        }
+
+    def acquire(self):
+        started = time.monotonic()
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    conn = None
+                    break
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                waited = True
+                self._cond.wait(remaining)
+
+            self._in_use += 1
+            self._stats['acquired'] += 1
+            if waited:
+                wait = time.monotonic() - started
+                self._stats['waits'] += 1
+                self._stats['wait_time_total'] += wait
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], wait)
+
+        try:
+            return self._new() if conn is None else self._checked(conn)
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard=False):
+        if not discard:
+            try:
+                # never hand the next borrower an open transaction or a stale snapshot
+                conn.rollback()
+            except Exception:
+                discard = True
+        if discard:
+            self._close(conn)
+        else:
+            conn._pool_last_used = time.monotonic()
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._open -= 1
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except pymysql.err.OperationalError:
+            self.release(conn, discard=True)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def stats(self):
+        with self._cond:
+            s = dict(self._stats)
+            s.update(size=self.size, open=self._open, in_use=self._in_use, idle=len(self._idle))
+        s['wait_time_avg'] = (s['wait_time_total'] / s['waits']) if s['waits'] else 0.0
+        return s
+
+    def close_idle(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._close(conn)
+
+    def _new(self):
+        conn = self._connect()
+        conn._pool_created = conn._pool_last_used = time.monotonic()
+        with self._cond:
+            self._stats['created'] += 1
+        return conn
+
+    def _checked(self, conn):
+        now = time.monotonic()
+        if now - conn._pool_created > self.recycle:
+            self._close(conn)
+            with self._cond:
+                self._stats['recycled'] += 1
+            return self._new()
+        if now - conn._pool_last_used > self.ping_after:
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                self._close(conn)
+                with self._cond:
+                    self._stats['ping_failures'] += 1
+                return self._new()
+        return conn
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+pool = ConnectionPool(DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PING_AFTER)
+
+
+def get_connection():
+    """
+    Inside a request (or any app context) this returns the connection bound to
+    that context, borrowed from the pool on first use and returned on teardown.
+    Nothing would return a connection opened outside an app context, so that is
+    an error: threads, Celery tasks and scripts use `pooled_connection()`.
+    """
+    if not has_app_context():
+        raise RuntimeError("get_connection() needs an app context; use pooled_connection() outside requests")
+    if 'db_conn' not in g:
+        g.db_conn = pool.acquire()
+    return g.db_conn
+
+
+def pooled_connection():
+    return pool.connection()
+
+
+def release_connection(exc=None):
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        pool.release(conn, discard=isinstance(exc, pymysql.err.OperationalError))
+
+
+def add_query_count_header(response):
+    response.headers['X-DB-Queries'] = str(g.get('db_queries', 0))
+    return response
+
+
+def init_app(app):
+    app.after_request(add_query_count_header)
+    app.teardown_appcontext(release_connection)
@@ -0,0 +1,83 @@
+import csv
+import io
+import json
+
+import pymysql
+
+from models.db import pool
+
+# Bytes of output collected before each write to the client
+CHUNK_BYTES = 64 * 1024
+# A slow client can stall the server's writes for this long before MySQL drops the
+# connection (net_write_timeout defaults to 60s)
+NET_WRITE_TIMEOUT = 600
+
+
+def stream_rows(sql, params=()):
+    """
+    Yield the first item as the column names, then each row as a dict, read
+    through an unbuffered SSDictCursor on a connection of its own so memory
+    stays flat whatever the size of the result.
+
+    If the consumer stops early (client went away) the connection is discarded:
+    closing an unbuffered cursor would otherwise read the rest of the result.
+    """
+    conn = pool.acquire()
+    finished = False
+    try:
+        cursor = conn.cursor(pymysql.cursors.SSDictCursor)
+        cursor.execute("SET SESSION net_write_timeout = %s", (NET_WRITE_TIMEOUT,))
+        cursor.execute(sql, params)
+        yield [d[0] for d in cursor.description]
+        for row in cursor.fetchall_unbuffered():
+            yield row
+        cursor.close()
+        finished = True
+    finally:
+        pool.release(conn, discard=not finished)
+
+
+def chunked(lines):
+    """Join `lines` into response chunks of about CHUNK_BYTES."""
+    lines = iter(lines)
+    # the first line goes out on its own so the client sees bytes straight away
+    for line in lines:
+        yield line
+        break
+    buf, size = [], 0
+    for line in lines:
+        buf.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield ''.join(buf)
+            buf, size = [], 0
+    if buf:
+        yield ''.join(buf)
+
+
+def ndjson_lines(rows):
+    next(rows)  # column names
+    for row in rows:
+        yield json.dumps(row, default=str, ensure_ascii=False) + '\n'
+
+
+def csv_lines(rows):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    for row in rows:
+        writer.writerow(row if isinstance(row, list) else row.values())
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+
+
+FORMATS = {
+    'ndjson': (ndjson_lines, 'application/x-ndjson'),
+    'csv': (csv_lines, 'text/csv'),
+}
+
+
+def stream(sql, params, fmt):
+    """(body generator, mimetype) for an export of `sql` in `fmt` ('ndjson' or 'csv')."""
+    to_lines, mimetype = FORMATS[fmt]
+    return chunked(to_lines(stream_rows(sql, params))), mimetype
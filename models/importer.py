@@ -0,0 +1,327 @@
+import csv
+import json
+import threading
+import time
+from datetime import datetime
+
+from config import IMPORT_BATCH_SIZE, IMPORT_STALE_AFTER
+from logger import get_logger
+from models.db import pooled_connection
+from models import stats
+from models import customers
+from models import phones
+
+logger = get_logger("importer")
+
+INSERT_SQL = """
+    INSERT INTO orders (
+        order_source, order_number, subtotal, shipping, total,
+        discount_code, discount_amount, created_at, quantity, item_name,
+        billing_name, billing_phone, billing_street, billing_city, status,
+        advance_delivery_charges, cod_amount, courier, shipping_status,
+        notes, preferred_courier, tracking_number, customer_type, phone_e164
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+# Re-imports keyed on uq_orders_line. Shopify fields are refreshed from the file;
+# workflow fields the team edits in the app only change when the file has a value,
+# and customer_type is never touched.
+UPSERT_SQL = INSERT_SQL + """
+    ON DUPLICATE KEY UPDATE
+        subtotal = VALUES(subtotal), shipping = VALUES(shipping), total = VALUES(total),
+        discount_code = VALUES(discount_code), discount_amount = VALUES(discount_amount),
+        created_at = VALUES(created_at), quantity = VALUES(quantity),
+        billing_name = VALUES(billing_name), billing_phone = VALUES(billing_phone),
+        phone_e164 = VALUES(phone_e164),
+        billing_street = VALUES(billing_street), billing_city = VALUES(billing_city),
+        advance_delivery_charges = VALUES(advance_delivery_charges), cod_amount = VALUES(cod_amount),
+        notes = VALUES(notes),
+        status = IF(VALUES(status) <> '', VALUES(status), status),
+        courier = IF(VALUES(courier) <> '', VALUES(courier), courier),
+        shipping_status = IF(VALUES(shipping_status) <> '', VALUES(shipping_status), shipping_status),
+        preferred_courier = IF(VALUES(preferred_courier) <> '', VALUES(preferred_courier), preferred_courier),
+        tracking_number = IF(VALUES(tracking_number) <> '', VALUES(tracking_number), tracking_number)
+"""
+
+
+def safe_float(value, fallback=0.0):
+    try:
+        return float(value)
+    except Exception as e:
+        if str(value).strip():
+            logger.warning(f"Failed float cast: {value} → {e}")
+        return fallback
+
+
+def parse_date(val):
+    val = str(val).strip()
+    if not val:
+        return datetime.now()
+    for fmt in ['%Y-%m-%d %H:%M:%S %z', '%m/%d/%Y']:
+        try:
+            return datetime.strptime(val, fmt)
+        except ValueError:
+            continue
+    logger.warning(f"Unrecognized date format: '{val}'")
+    return datetime.now()
+
+
+def to_record(row):
+    """Map one Shopify export row to the orders column tuple used by INSERT_SQL."""
+    phone = row.get('Billing Phone', '').strip()
+    return (
+        row.get('Order placed', 'Shopify'),
+        row.get('Order #', '').strip(),
+        safe_float(row.get('Subtotal')),
+        safe_float(row.get('Shipping')),
+        safe_float(row.get('Subtotal')) + safe_float(row.get('Shipping')),
+        row.get('Discount Code', '').strip(),
+        safe_float(row.get('Discount Amount')),
+        parse_date(row.get('Created at', '')).strftime('%Y-%m-%d %H:%M:%S'),
+        int(row.get('Lineitem quantity') or 1),
+        row.get('Lineitem name', '').strip(),
+        row.get('Billing Name', '').strip(),
+        phone,
+        row.get('Billing Street', '').strip(),
+        row.get('Billing City', '').strip(),
+        row.get('Status', '').strip(),
+        row.get('Advance Delivery Charges', '').strip(),
+        safe_float(row.get('COD Amount')),
+        row.get('Courier', '').strip(),
+        row.get('Shipping Status', '').strip(),
+        row.get('Notes from customer', '').strip(),
+        row.get('Preferred Courier company', '').strip(),
+        row.get('Tracking number', '').strip(),
+        '',
+        phones.normalize(phone),
+    )
+
+
+def record_dims(record):
+    return stats.row_dims(record[14], record[18], record[22], record[7], record[9],
+                          customers.key_for(record[11], record[10], record[13]))
+
+
+def iter_rows(filepath):
+    """Yield (row_number, raw_row, record_or_None, error_or_None) without loading the file."""
+    with open(filepath, newline='', encoding='utf-8') as csvfile:
+        for idx, row in enumerate(csv.DictReader(csvfile), start=1):
+            try:
+                yield idx, row, to_record(row), None
+            except Exception as e:
+                yield idx, row, None, str(e)
+
+
+def estimate_rows(filepath):
+    """Line count minus the header; quoted multi-line cells make this an upper bound."""
+    lines = 0
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            lines += chunk.count(b'\n')
+    return max(lines - 1, 0)
+
+
+def create_job(conn, filename, mode='upsert'):
+    with conn.cursor() as c:
+        c.execute("INSERT INTO import_jobs (filename, mode, status) VALUES (%s, %s, 'queued')", (filename, mode))
+        job_id = c.lastrowid
+    conn.commit()
+    return job_id
+
+
+def get_job(conn, job_id, error_limit=50):
+    with conn.cursor() as c:
+        c.execute("SELECT * FROM import_jobs WHERE id = %s", (job_id,))
+        job = c.fetchone()
+        if not job:
+            return None
+        c.execute("""
+            SELECT row_num, error, raw_row FROM import_errors
+            WHERE job_id = %s ORDER BY id LIMIT %s
+        """, (job_id, error_limit))
+        job['errors'] = c.fetchall()
+
+    done = job['rows_inserted'] + job['rows_updated'] + job['rows_unchanged'] + job['rows_failed']
+    started, finished = job.get('started_at'), job.get('finished_at')
+    elapsed = ((finished or datetime.now()) - started).total_seconds() if started else 0
+    job['elapsed_sec'] = round(elapsed, 1)
+    job['rows_per_sec'] = round(done / elapsed, 1) if elapsed > 0 else 0.0
+    job['percent'] = min(100, round(done * 100 / job['rows_total'])) if job['rows_total'] else 0
+    return job
+
+
+def _record_errors(cursor, job_id, errors):
+    cursor.executemany("""
+        INSERT INTO import_errors (job_id, row_num, error, raw_row) VALUES (%s, %s, %s, %s)
+    """, [(job_id, idx, err[:1000], json.dumps(raw, ensure_ascii=False)) for idx, raw, err in errors])
+
+
+class _Progress:
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.failed = 0
+
+    @property
+    def processed(self):
+        return self.inserted + self.updated + self.unchanged + self.failed
+
+    def save(self, cursor, status='running'):
+        cursor.execute("""
+            UPDATE import_jobs SET status = %s, rows_inserted = %s, rows_updated = %s,
+                rows_unchanged = %s, rows_failed = %s, heartbeat_at = NOW()
+            WHERE id = %s
+        """, (status, self.inserted, self.updated, self.unchanged, self.failed, self.job_id))
+
+
+def _line_key(record):
+    # (order_source, order_number, line item) as the unique index compares them
+    return tuple(str(v or '').rstrip().casefold() for v in (record[0], record[1], record[9]))
+
+
+def _keys_where(records):
+    keys = list({_line_key(r): (r[0], r[1], r[9]) for r in records}.values())
+    clause = "WHERE (order_source, order_number, item_name) IN (" + ", ".join(["(%s, %s, %s)"] * len(keys)) + ")"
+    return clause, [v for k in keys for v in k]
+
+
+def _write_rows(cursor, records, mode, progress):
+    """
+    Write `records` in one statement and keep the stats tables in step.
+
+    In upsert mode MySQL reports 1 affected row per insert, 2 per changed row
+    and 0 per unchanged row; with the number of keys that already existed that
+    splits the batch into inserted / updated / unchanged without extra queries.
+    """
+    if mode == 'append':
+        cursor.executemany(INSERT_SQL, records)
+        after = [record_dims(r) for r in records]
+        stats.apply_changes(cursor, after=after)
+        customers.refresh(cursor, customers.keys(after))
+        progress.inserted += len(records)
+        return
+
+    where, params = _keys_where(records)
+    before = stats.snapshot(cursor, where, params)
+    existing = sum(r['n'] for r in before)
+    affected = cursor.executemany(UPSERT_SQL, records) or 0
+    after = stats.snapshot(cursor, where, params)
+    stats.apply_changes(cursor, before, after)
+    customers.refresh(cursor, customers.keys(before, after))
+
+    inserted = len({_line_key(r) for r in records}) - existing
+    updated = (affected - inserted) // 2
+    progress.inserted += inserted
+    progress.updated += updated
+    progress.unchanged += len(records) - inserted - updated
+
+
+def _write_batch(conn, batch, errors, progress, mode):
+    """
+    Write one batch and commit it together with its stats delta, error rows and
+    progress. If the multi-row statement fails the batch is retried row by row,
+    each row behind a savepoint so a bad row's partial stats and customers
+    writes are undone with it and only that row is lost.
+    """
+    with conn.cursor() as c:
+        try:
+            if batch:
+                _write_rows(c, [rec for _, _, rec in batch], mode, progress)
+        except Exception:
+            conn.rollback()
+            for idx, raw, rec in batch:
+                c.execute("SAVEPOINT import_row")
+                try:
+                    _write_rows(c, [rec], mode, progress)
+                except Exception as e:
+                    c.execute("ROLLBACK TO SAVEPOINT import_row")
+                    errors.append((idx, raw, str(e)))
+                else:
+                    c.execute("RELEASE SAVEPOINT import_row")
+        if errors:
+            progress.failed += len(errors)
+            _record_errors(c, progress.job_id, errors)
+        progress.save(c)
+    conn.commit()
+
+
+def run_import(job_id, filepath, mode='upsert', batch_size=IMPORT_BATCH_SIZE):
+    """
+    Stream `filepath` into orders in committed batches, recording per-row errors
+    on the job. mode='upsert' updates lines already imported (same source, order
+    number and line item) instead of duplicating them; mode='append' inserts only.
+    """
+    progress = _Progress(job_id)
+    started = time.monotonic()
+    with pooled_connection() as conn:
+        try:
+            with conn.cursor() as c:
+                c.execute("""
+                    UPDATE import_jobs SET status = 'running', started_at = NOW(), heartbeat_at = NOW(),
+                        rows_total = %s
+                    WHERE id = %s
+                """, (estimate_rows(filepath), job_id))
+            conn.commit()
+
+            batch, errors = [], []
+            for idx, raw, record, error in iter_rows(filepath):
+                if error:
+                    errors.append((idx, raw, error))
+                else:
+                    batch.append((idx, raw, record))
+                if len(batch) >= batch_size:
+                    _write_batch(conn, batch, errors, progress, mode)
+                    stats.invalidate()
+                    batch, errors = [], []
+            if batch or errors:
+                _write_batch(conn, batch, errors, progress, mode)
+
+            with conn.cursor() as c:
+                c.execute("UPDATE import_jobs SET rows_total = %s, finished_at = NOW() WHERE id = %s",
+                          (progress.processed, job_id))
+                progress.save(c, status='done')
+            conn.commit()
+            elapsed = time.monotonic() - started
+            logger.info(f"Import {job_id} ({mode}): {progress.inserted} inserted, {progress.updated} updated, "
+                        f"{progress.unchanged} unchanged, {progress.failed} failed in {elapsed:.1f}s "
+                        f"({progress.processed / elapsed if elapsed else 0:.0f} rows/s)")
+        except Exception as e:
+            logger.exception(f"Import {job_id} failed")
+            conn.rollback()
+            with conn.cursor() as c:
+                c.execute("""
+                    UPDATE import_jobs SET status = 'failed', finished_at = NOW(), error = %s
+                    WHERE id = %s
+                """, (str(e)[:1000], job_id))
+            conn.commit()
+        finally:
+            stats.invalidate()
+
+
+def fail_stale_jobs(conn, stale_after=IMPORT_STALE_AFTER):
+    """
+    Mark imports that stopped reporting progress as failed. Imports run on a
+    thread in the web process, so a restart mid-file would otherwise leave the
+    job 'running' forever; every batch commit bumps heartbeat_at, so a live job
+    is never older than one batch.
+    """
+    with conn.cursor() as c:
+        failed = c.execute("""
+            UPDATE import_jobs
+            SET status = 'failed', finished_at = NOW(), error = 'Interrupted (the server restarted mid-import)'
+            WHERE status IN ('queued', 'running')
+              AND COALESCE(heartbeat_at, started_at, created_at) < NOW() - INTERVAL %s SECOND
+        """, (stale_after,))
+    conn.commit()
+    if failed:
+        logger.warning(f"Marked {failed} interrupted import job(s) as failed")
+    return failed
+
+
+def start_import(job_id, filepath, mode='upsert'):
+    """Run the import on a background thread so the upload request returns immediately."""
+    t = threading.Thread(target=run_import, args=(job_id, filepath, mode), name=f"import-{job_id}", daemon=True)
+    t.start()
+    return t
@@ -0,0 +1,134 @@
+import json
+import threading
+import time
+
+from config import TEMPLATE_VERSION_CHECK
+from logger import get_logger
+from models.db import pooled_connection
+from models import versions
+from models.renderer import compile_type
+
+logger = get_logger("templates")
+
+VERSION_KEY = 'templates'
+
+# message_templates rows in this category define message types (models/renderer.py):
+# template_name is the type, each content line one paragraph of the message
+MESSAGE_TYPE_CATEGORY = 'Message types'
+
+
+def parse_templates(rows):
+    """{template_name: [line, ...]} from message_templates rows; unreadable content is skipped."""
+    out = {}
+    for r in rows:
+        try:
+            lines = json.loads(r['content'] or '[]')
+        except ValueError:
+            logger.warning(f"Template {r['template_name']!r} has invalid JSON content, skipping")
+            continue
+        out[r['template_name']] = lines if isinstance(lines, list) else [str(lines)]
+    return out
+
+
+# message_templates.preview_text width, what the /templates cards show
+PREVIEW_CHARS = 120
+
+
+def summarize(content):
+    """
+    (preview_text, lines_count, chars_count) of a template's `content`, stored
+    with every write so the /templates listing never decodes content.
+    """
+    try:
+        parsed = json.loads(content or '')
+    except ValueError:
+        parsed = str(content or '')
+    if isinstance(parsed, list):
+        first = parsed[0] if parsed else ''
+        return (str(first)[:PREVIEW_CHARS], len(parsed),
+                sum(len(x) for x in parsed if isinstance(x, str)))
+    text = str(parsed)
+    return text[:PREVIEW_CHARS], max(1, text.count('\n') + 1), len(text)
+
+
+def compile_types(rows, templates):
+    """{message_type: Renderer} from the Active MESSAGE_TYPE_CATEGORY rows; broken ones are skipped."""
+    renderers = {}
+    for name, parts in parse_templates(rows).items():
+        try:
+            renderers[name] = compile_type(name, parts, templates)
+        except ValueError as e:
+            logger.warning(f"Skipping {e}")
+    return renderers
+
+
+class TemplateStore:
+    """
+    Parsed message templates and compiled message types shared by every
+    campaign in the process.
+
+    `get()` and `renderer()` cost nothing between version checks (at most one every
+    `check_interval` seconds, a primary-key lookup on cache_versions) and reloads
+    the table only when a template write has bumped the version.
+    """
+
+    def __init__(self, check_interval=TEMPLATE_VERSION_CHECK):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._templates = {}
+        self._renderers = {}
+        self._version = None
+        self._checked = 0.0
+        self.loads = 0
+
+    def _refresh(self):
+        # caller holds the lock
+        now = time.monotonic()
+        if self._version is not None and now - self._checked < self.check_interval:
+            return
+        with pooled_connection() as conn:
+            with conn.cursor() as c:
+                version = versions.current(c, VERSION_KEY)
+                if version != self._version:
+                    c.execute("SELECT template_name, category, status, content FROM message_templates")
+                    rows = c.fetchall()
+                    types = [r for r in rows if r['category'] == MESSAGE_TYPE_CATEGORY]
+                    self._templates = parse_templates([r for r in rows if r['category'] != MESSAGE_TYPE_CATEGORY])
+                    self._renderers = compile_types([r for r in types if r['status'] == 'Active'], self._templates)
+                    self._version = version
+                    self.loads += 1
+        self._checked = now
+
+    def get(self):
+        """{template_name: [line, ...]} of every template that is not a message type."""
+        with self._lock:
+            self._refresh()
+            return self._templates
+
+    def renderer(self, message_type):
+        """The compiled Renderer for `message_type`; KeyError if it has no Active definition."""
+        with self._lock:
+            self._refresh()
+            renderers = self._renderers
+        try:
+            return renderers[message_type]
+        except KeyError:
+            raise KeyError(f"no Active {MESSAGE_TYPE_CATEGORY!r} template named {message_type!r}") from None
+
+    def invalidate(self):
+        # check the version on the next get() instead of waiting out the interval
+        with self._lock:
+            self._checked = 0.0
+
+    def stats(self):
+        with self._lock:
+            return {'version': self._version, 'loads': self.loads, 'templates': len(self._templates),
+                    'message_types': sorted(self._renderers)}
+
+
+store = TemplateStore()
+
+
+def changed(cursor):
+    """Call from every message_templates write, before its commit."""
+    versions.bump(cursor, VERSION_KEY)
@@ -0,0 +1,78 @@
+from config import ORDERS_COUNT_CACHE_TTL
+from models.cache import TTLCache
+
+count_cache = TTLCache(ORDERS_COUNT_CACHE_TTL)
+
+
+def keyset_page(cursor, where, params, per_page, after_id=None, before_id=None, page=1,
+                columns='*', table='orders'):
+    """
+    One page of `table` newest-first, seeking on the primary key.
+
+    `after_id` continues below the last id of the previous page and `before_id`
+    walks back above the first id of the next one, so every page costs one
+    index range scan of `per_page + 1` rows. A bare `page` number (old links)
+    still falls back to OFFSET.
+    """
+    where = list(where)
+    params = list(params)
+    offset = 0
+    if after_id:
+        where.append("id < %s")
+        params.append(after_id)
+        order = "DESC"
+    elif before_id:
+        where.append("id > %s")
+        params.append(before_id)
+        order = "ASC"
+    else:
+        offset = (page - 1) * per_page
+        order = "DESC"
+
+    where_sql = (" WHERE " + " AND ".join(where)) if where else ""
+    sql = f"SELECT {columns} FROM {table}{where_sql} ORDER BY id {order} LIMIT %s"
+    params.append(per_page + 1)
+    if offset:
+        sql += " OFFSET %s"
+        params.append(offset)
+
+    cursor.execute(sql, params)
+    rows = list(cursor.fetchall())
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if before_id:
+        rows.reverse()
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = bool(after_id) or page > 1, more
+
+    return {
+        'rows': rows,
+        'has_prev': has_prev and bool(rows),
+        'has_next': has_next and bool(rows),
+        'next_after_id': rows[-1]['id'] if rows else None,
+        'prev_before_id': rows[0]['id'] if rows else None,
+    }
+
+
+def count_rows(cursor, where_sql, params, mode='cached', table='orders'):
+    """
+    Row count for a filtered list.
+
+    mode='exact' runs COUNT(*), 'approx' reads the optimizer's row estimate from
+    EXPLAIN, and 'cached' (default) runs COUNT(*) at most once per
+    ORDERS_COUNT_CACHE_TTL seconds for the same filter.
+    """
+    if mode == 'approx':
+        cursor.execute(f"EXPLAIN SELECT id FROM {table}{where_sql}", params)
+        plan = cursor.fetchall()
+        return int(plan[0].get('rows') or 0) if plan else 0
+
+    def exact():
+        cursor.execute(f"SELECT COUNT(*) AS total FROM {table}{where_sql}", params)
+        return cursor.fetchone()['total']
+
+    if mode == 'exact':
+        return exact()
+    return count_cache.get_or_set((table, where_sql, tuple(params)), exact)
@@ -0,0 +1,37 @@
+import re
+
+from config import PHONE_DEFAULT_COUNTRY
+
+# E.164: a country code and subscriber number, at most 15 digits in total
+E164_MAX_DIGITS = 15
+E164_MIN_DIGITS = 8
+# longest national number without its trunk 0; anything longer that starts with
+# the country code already carries it
+NATIONAL_MAX_DIGITS = 10
+
+
+def normalize(phone, country=PHONE_DEFAULT_COUNTRY):
+    """
+    '+923001234567' for '0300-1234567', '0092 300 1234567', '923001234567',
+    '3001234567' or '+92 (300) 1234567'; None when there is no plausible number.
+
+    Numbers without an international prefix are read as national numbers of
+    `country`: a leading trunk 0 is dropped, and the country code is added
+    unless the digits already start with it.
+    """
+    if not phone:
+        return None
+    phone = str(phone).strip()
+    digits = re.sub(r'\D', '', phone)
+    if not digits:
+        return None
+    if not phone.startswith('+'):
+        if digits.startswith('00'):
+            digits = digits[2:]
+        elif digits.startswith('0'):
+            digits = country + digits[1:]
+        elif not (digits.startswith(country) and len(digits) > NATIONAL_MAX_DIGITS):
+            digits = country + digits
+    if not E164_MIN_DIGITS <= len(digits) <= E164_MAX_DIGITS:
+        return None
+    return '+' + digits
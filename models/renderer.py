@@ -0,0 +1,142 @@
+"""
+Compiled WhatsApp messages.
+
+A message type is a list of parts, one paragraph each. A part is text with order
+fields ({name}, {product}, {order_num}, {price}, {tracking}) and template
+references: {@greetings} picks a random line of the `greetings` template,
+{@greetings|Hi} falls back to 'Hi' when that template is missing or empty.
+Template lines may use the same order fields.
+
+compile_type() does the parsing once: every line is rewritten into a format
+string that only contains known fields (anything else is escaped and shows up
+literally), and the message becomes a short list of choices. A render picks one
+option per choice, formats only the options that have fields, and joins.
+"""
+import random
+import re
+from string import Formatter
+
+FIELDS = ('name', 'product', 'order_num', 'price', 'tracking')
+
+TEMPLATE_REF = re.compile(r'\{@(\w+)(?:\|((?:[^{}]|\{\w+\})*))?\}')
+
+_parse = Formatter().parse
+
+
+def fields_for(user):
+    """Format fields for one recipient (an orders / campaign_recipients row)."""
+    return {
+        'name': user.get('billing_name') or 'Customer',
+        'product': user.get('item_name') or 'your product',
+        'order_num': user.get('order_number'),
+        'price': user.get('total'),
+        'tracking': user.get('tracking_number') or '',
+    }
+
+
+def _escape(text):
+    return text.replace('{', '{{').replace('}', '}}')
+
+
+def compile_text(text):
+    """`text` as a format string safe for format_map(fields_for(...))."""
+    try:
+        parsed = list(_parse(text))
+    except ValueError:
+        return _escape(text)
+    out = []
+    for literal, name, spec, conversion in parsed:
+        out.append(_escape(literal))
+        if name is None:
+            continue
+        field = name + (f'!{conversion}' if conversion else '') + (f':{spec}' if spec else '')
+        if name in FIELDS and '{' not in (spec or ''):
+            out.append('{' + field + '}')
+        else:
+            # kept as written, so a typo shows up in the message instead of failing the send
+            out.append(_escape('{' + field + '}'))
+    return ''.join(out)
+
+
+def compile_part(part, templates):
+    """
+    One paragraph as a list of slots: a format string, or a tuple of them to
+    pick from. `templates` is {template_name: [line, ...]}.
+    """
+    slots = []
+    pos = 0
+    for m in TEMPLATE_REF.finditer(part):
+        if m.start() > pos:
+            slots.append(compile_text(part[pos:m.start()]))
+        lines = [str(line) for line in templates.get(m.group(1)) or [] if str(line).strip()]
+        choices = tuple(compile_text(line) for line in lines or [m.group(2) or ''])
+        slots.append(choices[0] if len(choices) == 1 else choices)
+        pos = m.end()
+    if pos < len(part):
+        slots.append(compile_text(part[pos:]))
+    return slots
+
+
+def _has_fields(fmt):
+    return any(name is not None for _, name, _, _ in _parse(fmt))
+
+
+def _plan(slots):
+    """
+    Fold every fixed string into each option of the choice before it, then mark
+    each group static (final text, picked as is) or not (bound format_map, called
+    with the recipient's fields) so lines without fields are never formatted.
+    """
+    groups = []
+    for s in slots:
+        if s.__class__ is str:
+            if groups:
+                groups[-1] = tuple(o + s for o in groups[-1])
+            else:
+                groups.append((s,))
+        else:
+            groups.append(s)
+    plan = []
+    for g in groups:
+        if any(_has_fields(o) for o in g):
+            plan.append((False, tuple(o.format_map for o in g)))
+        else:
+            plan.append((True, tuple(o.format_map({}) for o in g)))
+    return plan
+
+
+class Renderer:
+    """One compiled message type."""
+
+    __slots__ = ('name', 'plan')
+
+    def __init__(self, name, plan):
+        self.name = name
+        self.plan = plan
+
+    def render(self, user, rng=random):
+        r, fields = rng.random, fields_for(user)
+        return ''.join([g[int(r() * len(g))] if static else g[int(r() * len(g))](fields)
+                        for static, g in self.plan])
+
+    def render_many(self, recipients, rng=random):
+        """Messages for `recipients`, in order."""
+        plan, r = self.plan, rng.random
+        out = []
+        for user in recipients:
+            fields = fields_for(user)
+            out.append(''.join([g[int(r() * len(g))] if static else g[int(r() * len(g))](fields)
+                                for static, g in plan]))
+        return out
+
+
+def compile_type(name, parts, templates):
+    """Renderer for message type `name` from its `parts` (a list of strings)."""
+    if not isinstance(parts, list) or not parts:
+        raise ValueError(f"message type {name!r} needs a non-empty list of parts")
+    slots = []
+    for i, part in enumerate(parts):
+        if i:
+            slots.append("\n\n")
+        slots.extend(compile_part(str(part), templates))
+    return Renderer(name, _plan(slots))
@@ -0,0 +1,80 @@
+import re
+
+from metrics import LatencyStats
+from models import phones
+
+# Latency per query type, exposed at /metrics/search
+search_latency = LatencyStats()
+
+PHONE_MIN_DIGITS = 7
+FULLTEXT_MIN_TOKEN = 3   # innodb_ft_min_token_size
+
+_PHONE_CHARS = re.compile(r'^\+?[\d\s\-()]+$')
+_ORDER_NUMBER = re.compile(r'^#?[A-Za-z]{0,6}-?\d+$')
+
+
+def classify(q):
+    """
+    Route a search string by shape:
+      'phone' - mostly digits, long enough to be a phone number
+      'order' - '#1001', 'ORD123' or a short run of digits
+      'text'  - anything else (names, cities, items)
+    """
+    q = q.strip()
+    digits = re.sub(r'\D', '', q)
+    if _PHONE_CHARS.match(q) and len(digits) >= PHONE_MIN_DIGITS:
+        return 'phone'
+    if _ORDER_NUMBER.match(q):
+        return 'order'
+    return 'text'
+
+
+def like_prefix(value):
+    """LIKE pattern matching strings that start with `value`, wildcards escaped."""
+    return re.sub(r'([%_\\])', r'\\\1', value.strip()) + '%'
+
+
+def _phone_clause(q):
+    # 03001234567, 923001234567 and +92 300 1234567 all normalize to the same
+    # phone_e164, so a full number is one index seek and a partial one a range
+    e164 = phones.normalize(q)
+    if e164:
+        return "phone_e164 LIKE %s", [like_prefix(e164)]
+    return "billing_phone LIKE %s", [like_prefix(re.sub(r'\D', '', q))]
+
+
+def _order_clause(q):
+    bare = q.strip().lstrip('#')
+    return "(order_number LIKE %s OR order_number LIKE %s)", [bare + '%', '#' + bare + '%']
+
+
+def match_clause(columns, q):
+    """
+    (clause, params) matching every word of `q` as a prefix through the FULLTEXT
+    index on `columns`, or None when no word is long enough to be indexed.
+    """
+    # plain words only, so user input can't inject boolean-mode operators
+    tokens = [t for t in re.findall(r'\w+', q) if len(t) >= FULLTEXT_MIN_TOKEN]
+    if not tokens:
+        return None
+    against = ' '.join(f'+{t}*' for t in tokens)
+    return f"MATCH({columns}) AGAINST (%s IN BOOLEAN MODE)", [against]
+
+
+def _text_clause(q):
+    match = match_clause("billing_name, billing_city, item_name", q)
+    if match:
+        return match
+    # every word is below the FULLTEXT token size: fall back to prefix matches
+    like = like_prefix(q)
+    return "(billing_name LIKE %s OR billing_city LIKE %s OR item_name LIKE %s)", [like, like, like]
+
+
+_BUILDERS = {'phone': _phone_clause, 'order': _order_clause, 'text': _text_clause}
+
+
+def build(q, kind=None):
+    """Return (kind, where clause, params) for an /orders search string."""
+    kind = kind if kind in _BUILDERS else classify(q)
+    clause, params = _BUILDERS[kind](q)
+    return kind, clause, params
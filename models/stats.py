@@ -0,0 +1,221 @@
+import re
+from collections import Counter
+
+from config import DASHBOARD_CACHE_TTL
+from models.cache import TTLCache
+from models.pagination import count_cache
+from models import versions
+from models.customers import cards_cache
+
+dashboard_cache = TTLCache(DASHBOARD_CACHE_TTL)
+
+# cache_versions row bumped by every orders write; ETags on /api/orders are built from it
+VERSION_KEY = 'orders'
+
+# ---------- reads (O(number of buckets)) ----------
+
+DASHBOARD_COUNTS_SQL = """
+    SELECT
+        COALESCE(SUM(cnt), 0)                                                AS total_orders,
+        COALESCE(SUM(CASE WHEN status = 'Confirmed'      THEN cnt END), 0)   AS confirmed_orders,
+        COALESCE(SUM(CASE WHEN status = 'Cancelled'      THEN cnt END), 0)   AS cancelled_orders,
+        COALESCE(SUM(CASE WHEN status = 'Pending'        THEN cnt END), 0)   AS pending_orders,
+        COALESCE(SUM(CASE WHEN status = 'Not Responding' THEN cnt END), 0)   AS not_responding_orders,
+        COALESCE(SUM(CASE WHEN status = 'To Process'     THEN cnt END), 0)   AS to_process_orders,
+        COALESCE(SUM(CASE WHEN shipping_status = 'Failed Delivery' THEN cnt END), 0) AS failed_delivery_orders,
+        COALESCE(SUM(CASE WHEN customer_type = 'Valued'  THEN cnt END), 0)   AS valued_orders
+    FROM order_stats_by_status
+"""
+
+TOP_PRODUCTS_SQL = """
+    SELECT item_name, cnt
+    FROM order_stats_by_item
+    ORDER BY cnt DESC
+    LIMIT 5
+"""
+
+ORDERS_BY_MONTH_SQL = """
+    SELECT ym, cnt
+    FROM order_stats_by_month
+    ORDER BY ym ASC
+"""
+
+
+def _compute_dashboard(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(DASHBOARD_COUNTS_SQL)
+        counts = {k: int(v or 0) for k, v in cursor.fetchone().items()}
+
+        cursor.execute(TOP_PRODUCTS_SQL)
+        tp = cursor.fetchall()
+
+        cursor.execute(ORDERS_BY_MONTH_SQL)
+        oot = cursor.fetchall()
+
+    return {
+        **counts,
+        'top_products_labels': [r['item_name'] for r in tp],
+        'top_products_counts': [r['cnt'] for r in tp],
+        'orders_over_time_labels': [r['ym'] for r in oot],
+        'orders_over_time_counts': [r['cnt'] for r in oot],
+    }
+
+
+def dashboard_summary(conn):
+    """Counters and chart series for the dashboard, cached for DASHBOARD_CACHE_TTL seconds."""
+    return dashboard_cache.get_or_set('dashboard', lambda: _compute_dashboard(conn))
+
+
+def bucket_count(conn, status):
+    """
+    Number of orders behind a dashboard card: 'total', 'Valued' (customer type)
+    or any order/shipping status, matching the filters used by the order lists.
+    """
+    if status == 'total':
+        sql, params = "SELECT COALESCE(SUM(cnt), 0) AS cnt FROM order_stats_by_status", ()
+    elif status == 'Valued':
+        sql = "SELECT COALESCE(SUM(cnt), 0) AS cnt FROM order_stats_by_status WHERE customer_type = %s"
+        params = (status,)
+    else:
+        sql = ("SELECT COALESCE(SUM(cnt), 0) AS cnt FROM order_stats_by_status "
+               "WHERE status = %s OR shipping_status = %s")
+        params = (status, status)
+    with conn.cursor() as cursor:
+        cursor.execute(sql, params)
+        return int(cursor.fetchone()['cnt'])
+
+
+def invalidate():
+    # drop every cached read derived from orders
+    dashboard_cache.clear()
+    count_cache.clear()
+    cards_cache.clear()
+
+
+def version(cursor):
+    return versions.current(cursor, VERSION_KEY)
+
+
+def touch(cursor):
+    """Mark orders as changed for writes that move no counters (courier, tracking number...)."""
+    versions.bump(cursor, VERSION_KEY)
+
+
+# ---------- writes (incremental maintenance) ----------
+
+# Grouped dimensions of the rows matched by a WHERE clause. Locks those rows so the
+# before/after picture can't shift under a concurrent writer.
+SNAPSHOT_SQL = """
+    SELECT COALESCE(status, '') AS status,
+           COALESCE(shipping_status, '') AS shipping_status,
+           COALESCE(customer_type, '') AS customer_type,
+           DATE_FORMAT(created_at, '%%Y-%%m') AS ym,
+           COALESCE(item_name, '') AS item_name,
+           customer_key,
+           COUNT(*) AS n
+    FROM orders
+    {where}
+    GROUP BY 1, 2, 3, 4, 5, 6
+    FOR UPDATE
+"""
+
+_YM = re.compile(r'^(\d{4}-\d{2})')
+
+
+def snapshot(cursor, where_sql, params=()):
+    cursor.execute(SNAPSHOT_SQL.format(where=where_sql), params)
+    return cursor.fetchall()
+
+
+def row_dims(status, shipping_status, customer_type, created_at, item_name, customer_key=None):
+    """Dimensions of a row that is about to be inserted, in the same shape as `snapshot()`."""
+    if hasattr(created_at, 'strftime'):
+        ym = created_at.strftime('%Y-%m')
+    else:
+        m = _YM.match(str(created_at or ''))
+        ym = m.group(1) if m else None
+    return {
+        'status': status or '',
+        'shipping_status': shipping_status or '',
+        'customer_type': customer_type or '',
+        'ym': ym,
+        'item_name': item_name or '',
+        'customer_key': customer_key,
+        'n': 1,
+    }
+
+
+def apply_changes(cursor, before=(), after=()):
+    """
+    Move the summary tables from the `before` picture of the touched rows to the
+    `after` one. Runs on the caller's cursor so it commits with the write itself.
+    """
+    touch(cursor)
+    by_status, by_month, by_item = Counter(), Counter(), Counter()
+    for rows, sign in ((before, -1), (after, 1)):
+        for r in rows:
+            n = sign * int(r.get('n', 1))
+            by_status[(r['status'] or '', r['shipping_status'] or '', r['customer_type'] or '')] += n
+            if r['ym'] and not r['ym'].startswith('0000'):
+                by_month[r['ym']] += n
+            if r['item_name']:
+                by_item[r['item_name']] += n
+
+    by_status = [k + (v,) for k, v in by_status.items() if v]
+    by_month = [(k, v) for k, v in by_month.items() if v]
+    by_item = [(k, v) for k, v in by_item.items() if v]
+
+    if by_status:
+        cursor.executemany("""
+            INSERT INTO order_stats_by_status (status, shipping_status, customer_type, cnt)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE cnt = cnt + VALUES(cnt)
+        """, by_status)
+    if by_month:
+        cursor.executemany("""
+            INSERT INTO order_stats_by_month (ym, cnt) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE cnt = cnt + VALUES(cnt)
+        """, by_month)
+    if by_item:
+        cursor.executemany("""
+            INSERT INTO order_stats_by_item (item_name, cnt) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE cnt = cnt + VALUES(cnt)
+        """, by_item)
+
+    if any(r[-1] < 0 for r in by_status + by_month + by_item):
+        for table in ('order_stats_by_status', 'order_stats_by_month', 'order_stats_by_item'):
+            cursor.execute(f"DELETE FROM {table} WHERE cnt <= 0")
+
+
+def clear(cursor):
+    touch(cursor)
+    for table in ('order_stats_by_status', 'order_stats_by_month', 'order_stats_by_item'):
+        cursor.execute(f"DELETE FROM {table}")
+
+
+def rebuild(conn):
+    """Recompute all summary tables from `orders` in one transaction."""
+    with conn.cursor() as cursor:
+        clear(cursor)
+        cursor.execute("""
+            INSERT INTO order_stats_by_status (status, shipping_status, customer_type, cnt)
+            SELECT COALESCE(status, ''), COALESCE(shipping_status, ''), COALESCE(customer_type, ''), COUNT(*)
+            FROM orders
+            GROUP BY 1, 2, 3
+        """)
+        cursor.execute("""
+            INSERT INTO order_stats_by_month (ym, cnt)
+            SELECT DATE_FORMAT(created_at, '%Y-%m') AS ym, COUNT(*)
+            FROM orders
+            WHERE created_at IS NOT NULL AND created_at > '0000-00-00'
+            GROUP BY ym
+        """)
+        cursor.execute("""
+            INSERT INTO order_stats_by_item (item_name, cnt)
+            SELECT item_name, COUNT(*)
+            FROM orders
+            WHERE item_name <> '' AND item_name IS NOT NULL
+            GROUP BY item_name
+        """)
+    conn.commit()
+    invalidate()
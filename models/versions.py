@@ -0,0 +1,16 @@
+# Version counters for in-process caches shared across processes. A write bumps
+# the counter in the same transaction; readers compare it with the version they
+# cached instead of re-reading the data itself.
+
+
+def bump(cursor, name):
+    cursor.execute("""
+        INSERT INTO cache_versions (name, version) VALUES (%s, 1)
+        ON DUPLICATE KEY UPDATE version = version + 1
+    """, (name,))
+
+
+def current(cursor, name):
+    cursor.execute("SELECT version FROM cache_versions WHERE name = %s", (name,))
+    row = cursor.fetchone()
+    return row['version'] if row else 0
@@ -97,3 +97,230 @@ CREATE INDEX idx_orders_billing_city           ON orders (billing_city);
 CREATE INDEX idx_orders_billing_phone          ON orders (billing_phone);
 
 ALTER TABLE orders ADD FULLTEXT idx_orders_fulltext (billing_name, billing_city);
+
+
+-- Order counters kept current by every write path (see models/stats.py).
+-- Rebuild from scratch with: flask --app app rebuild-order-stats
+CREATE TABLE IF NOT EXISTS order_stats_by_status (
+    status VARCHAR(255) NOT NULL DEFAULT '',
+    shipping_status VARCHAR(255) NOT NULL DEFAULT '',
+    customer_type VARCHAR(255) NOT NULL DEFAULT '',
+    cnt INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (status, shipping_status, customer_type)
+);
+
+CREATE TABLE IF NOT EXISTS order_stats_by_month (
+    ym CHAR(7) NOT NULL PRIMARY KEY,
+    cnt INT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS order_stats_by_item (
+    item_name VARCHAR(255) NOT NULL PRIMARY KEY,
+    cnt INT NOT NULL DEFAULT 0,
+    INDEX idx_order_stats_by_item_cnt (cnt)
+);
+
+
+-- /orders search (models/search.py): order numbers and phones use B-tree prefix
+-- lookups, names/cities/items use one FULLTEXT index over all three columns.
+CREATE INDEX idx_orders_order_number ON orders (order_number);
+ALTER TABLE orders DROP INDEX idx_orders_fulltext;
+ALTER TABLE orders ADD FULLTEXT idx_orders_search (billing_name, billing_city, item_name);
+
+
+-- Streaming CSV imports (models/importer.py); the dashboard polls /import/<id>
+CREATE TABLE IF NOT EXISTS import_jobs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    filename VARCHAR(255) NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'queued',
+    rows_total INT NOT NULL DEFAULT 0,
+    rows_inserted INT NOT NULL DEFAULT 0,
+    rows_failed INT NOT NULL DEFAULT 0,
+    error TEXT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at DATETIME NULL,
+    finished_at DATETIME NULL
+);
+
+CREATE TABLE IF NOT EXISTS import_errors (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    job_id INT NOT NULL,
+    row_num INT NOT NULL,
+    error VARCHAR(1000) NOT NULL,
+    raw_row TEXT NULL,
+    INDEX idx_import_errors_job (job_id, id)
+);
+
+
+-- Idempotent re-imports: one row per (source, order number, line item).
+-- Existing databases with duplicate lines: run `flask --app app dedupe-orders` first.
+ALTER TABLE orders ADD UNIQUE KEY uq_orders_line (order_source, order_number, item_name);
+
+ALTER TABLE import_jobs
+  ADD COLUMN mode VARCHAR(16) NOT NULL DEFAULT 'upsert' AFTER filename,
+  ADD COLUMN rows_updated INT NOT NULL DEFAULT 0 AFTER rows_inserted,
+  ADD COLUMN rows_unchanged INT NOT NULL DEFAULT 0 AFTER rows_updated;
+
+
+-- WhatsApp campaigns run on the Celery worker (whatsapp/campaigns.py);
+-- the dashboard polls /campaigns/<id> for sent / failed / remaining
+CREATE TABLE IF NOT EXISTS campaigns (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    message_type VARCHAR(32) NOT NULL,
+    headless TINYINT(1) NOT NULL DEFAULT 0,
+    status VARCHAR(16) NOT NULL DEFAULT 'queued',
+    total INT NOT NULL DEFAULT 0,
+    sent INT NOT NULL DEFAULT 0,
+    failed INT NOT NULL DEFAULT 0,
+    error TEXT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at DATETIME NULL,
+    finished_at DATETIME NULL
+);
+
+CREATE TABLE IF NOT EXISTS campaign_errors (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    campaign_id INT NOT NULL,
+    phone VARCHAR(32) NULL,
+    order_number VARCHAR(64) NULL,
+    error VARCHAR(1000) NOT NULL,
+    INDEX idx_campaign_errors_campaign (campaign_id, id)
+);
+
+
+-- Version counters for in-process caches (models/versions.py); template writes
+-- bump 'templates' so campaign workers reload them without polling the table
+CREATE TABLE IF NOT EXISTS cache_versions (
+    name VARCHAR(32) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+
+-- /api/orders column filters (support/delivery tables). InnoDB appends the primary
+-- key to secondary indexes, so an equality filter still pages on id order.
+CREATE INDEX idx_orders_status ON orders (status);
+CREATE INDEX idx_orders_shipping_status ON orders (shipping_status);
+CREATE INDEX idx_orders_courier ON orders (courier);
+
+
+-- Customer rollup (models/customers.py): one row per orders.customer_key, refreshed
+-- for the affected keys on every order write. Fill it once with
+-- `flask --app app rebuild-customers`.
+CREATE TABLE IF NOT EXISTS customers (
+    customer_key VARCHAR(512) NOT NULL PRIMARY KEY,
+    billing_name VARCHAR(255) NULL,
+    billing_phone VARCHAR(255) NULL,
+    billing_city VARCHAR(255) NULL,
+    billing_street TEXT NULL,
+    preferred_courier VARCHAR(255) NULL,
+    customer_type VARCHAR(255) NULL,
+    orders_count INT NOT NULL DEFAULT 0,
+    total_spent DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    joined_at DATETIME NULL,
+    last_order_at DATETIME NULL,
+    INDEX idx_customers_last_order (last_order_at),
+    INDEX idx_customers_joined (joined_at),
+    INDEX idx_customers_type_last_order (customer_type, last_order_at)
+);
+
+
+-- Normalized phone (models/phones.py), written by every order write path. Customers
+-- are grouped on it so '0300-1234567' and '+923001234567' are one customer_key.
+-- Fill existing rows with `flask --app app backfill-phones` (also rebuilds customers).
+ALTER TABLE orders ADD COLUMN phone_e164 VARCHAR(16) NULL AFTER billing_phone;
+CREATE INDEX idx_orders_phone_e164 ON orders (phone_e164);
+ALTER TABLE orders MODIFY COLUMN customer_key VARCHAR(512)
+  GENERATED ALWAYS AS (
+    COALESCE(
+      phone_e164,
+      NULLIF(TRIM(billing_phone), ''),
+      CONCAT('N:', COALESCE(TRIM(billing_name),''), '|C:', COALESCE(TRIM(billing_city),''))
+    )
+  ) STORED;
+
+
+-- Campaign suppressions (whatsapp/campaigns.py): customer-level promos write a cooldown
+-- row per customer and type after sending; message_type '*' opts a customer out of all
+-- campaigns. Recipient selection skips live rows with primary key lookups.
+CREATE TABLE IF NOT EXISTS campaign_suppressions (
+    customer_key VARCHAR(512) NOT NULL,
+    message_type VARCHAR(32) NOT NULL,
+    suppressed_until DATETIME NOT NULL,
+    reason VARCHAR(32) NOT NULL DEFAULT 'cooldown',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (customer_key, message_type)
+);
+
+
+-- Per-recipient campaign state (whatsapp/campaigns.py), written when a campaign first
+-- runs and checkpointed after every send. POST /campaigns/<id>/resume continues a
+-- failed or interrupted campaign with the pending and failed rows only.
+CREATE TABLE IF NOT EXISTS campaign_recipients (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    campaign_id INT NOT NULL,
+    customer_key VARCHAR(512) NOT NULL,
+    order_number VARCHAR(255) NULL,
+    order_ids TEXT NOT NULL,
+    billing_name VARCHAR(255) NULL,
+    item_name VARCHAR(255) NULL,
+    billing_phone VARCHAR(255) NULL,
+    phone_e164 VARCHAR(16) NULL,
+    total FLOAT NULL,
+    tracking_number VARCHAR(255) NULL,
+    status VARCHAR(8) NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    error VARCHAR(1000) NULL,
+    updated_at DATETIME NULL,
+    INDEX idx_campaign_recipients_status (campaign_id, status, id)
+);
+
+-- Per-profile send counts and achieved rate of the last flush (whatsapp/sender.py SessionMetrics)
+ALTER TABLE campaigns ADD COLUMN session_stats TEXT NULL;
+
+
+-- Message types (models/renderer.py): rows in the 'Message types' category are the
+-- layout of each campaign message, one paragraph per line. {@name} is a random line of
+-- template `name` ({@name|text} falls back to text), {name} {product} {order_num}
+-- {price} {tracking} are order fields. Edits apply to running workers like any template.
+-- Audiences stay in whatsapp/campaigns.py MESSAGE_TYPES: a new type needs an entry there too.
+INSERT IGNORE INTO message_templates (template_name, description, category, content) VALUES
+('confirmation', 'Order confirmation request', 'Message types',
+ '["{@greetings|Hi}, *{name}*,", "{@intros|Thank you for your order}", "{@order_lines|Your order: {product}}", "{@confirmation_requests|Please confirm}", "{@closings|Best regards}"]'),
+('return', 'Failed delivery follow-up', 'Message types',
+ '["{@return_greetings|Hi}, *{name}*,", "{@return_intros|Your order was returned}", "{@return_order_lines|Order: {product}}", "{@return_requests|Do you still need it? We can resend via another courier}", "{@return_closings|Let us know}"]'),
+('cancelled', 'Win back cancelled customers', 'Message types',
+ '["{@cancelled_greetings|Hi}, *{name}*,", "{@cancelled_intros|We noticed your order was cancelled}", "{@cancelled_order_lines|But we have new products}", "{@cancelled_requests|Are you interested?}", "{@cancelled_closings|Check our range}"]'),
+('valued', 'Offers for valued customers', 'Message types',
+ '["{@valued_greetings|Hi valued customer}, *{name}*,", "{@valued_intros|Thanks for your past orders}", "{@valued_order_lines|Check our latest products and bundles}", "{@valued_requests|Special offers for you}", "{@valued_closings|Shop now}"]'),
+('tracking', 'Shipped, with tracking number', 'Message types',
+ '["{@tracking_greetings|Hi}, *{name}*,", "{@tracking_intros|Your order is on the way}", "{@tracking_order_lines|Track your parcel}", "Tracking number: {tracking}", "{@tracking_closings|Happy shopping}"]');
+INSERT INTO cache_versions (name, version) VALUES ('templates', 1)
+  ON DUPLICATE KEY UPDATE version = version + 1;
+
+
+-- Listing fields of each template (models/message_templates.py summarize()), written by
+-- every template save so /templates never decodes content; fill existing rows with
+-- `flask --app app summarize-templates`. Template search goes through the FULLTEXT index.
+ALTER TABLE message_templates
+  ADD COLUMN preview_text VARCHAR(120) NULL,
+  ADD COLUMN lines_count INT NULL,
+  ADD COLUMN chars_count INT NULL;
+ALTER TABLE message_templates ADD FULLTEXT idx_message_templates_fulltext (template_name, description, content);
+
+
+-- Resume safety (whatsapp/campaigns.py): `applied` is set in the transaction that writes a
+-- send's order update and cooldown, so a resumed campaign never re-applies them; a worker
+-- refreshes heartbeat_at on every flush and only a stale 'running' campaign can be resumed.
+ALTER TABLE campaign_recipients ADD COLUMN applied TINYINT NOT NULL DEFAULT 0;
+UPDATE campaign_recipients SET applied = 1 WHERE status = 'sent';
+ALTER TABLE campaigns ADD COLUMN heartbeat_at DATETIME NULL;
+
+-- Imports bump heartbeat_at on every batch commit; jobs that stop reporting (the
+-- web process restarted mid-file) are marked failed when polled.
+ALTER TABLE import_jobs ADD COLUMN heartbeat_at DATETIME NULL AFTER started_at;
+
+-- /customers searches name, phone and city by prefix (search.like_prefix), one range
+-- per column merged by the optimizer instead of a scan of the rollup.
+CREATE INDEX idx_customers_name ON customers (billing_name);
+CREATE INDEX idx_customers_phone ON customers (billing_phone);
+CREATE INDEX idx_customers_city ON customers (billing_city);
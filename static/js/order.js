@@ -1,91 +1,93 @@
 function loadOrders() {
-    $.get('/get_orders', function(data) {
-        $('#orders-table').DataTable({
-            destroy: true,
-            data: data,
-            columns: [
-                { data: 'id' },
-                { data: 'order_number' },
-                { data: 'item_name' },
-                { data: 'billing_name' },
-                { data: 'billing_phone' },
-                { data: 'billing_street' },
-                { data: 'billing_city' },
-                { data: 'subtotal' },
-                { data: 'shipping' },
-                { data: 'total' },
-                { data: 'discount_code' },
-                { data: 'discount_amount' },
-                { data: 'cod_amount' },
-                { data: 'advance_delivery_charges' },
-                { data: 'courier' },
-                { data: 'shipping_status' },
-                {
-                    data: 'status',
-                    render: function (data, type, row) {
-                        return `
-                            <select class="status-select form-control form-select-sm" data-id="${row.id}">
-                                <option ${data === 'Confirmed' ? 'selected' : ''}>Confirmed</option>
-                                <option ${data === 'Pending' ? 'selected' : ''}>Pending</option>
-                                <option ${data === 'Cancelled' ? 'selected' : ''}>Cancelled</option>
-                                <option ${data === 'Not Responding' ? 'selected' : ''}>Not Responding</option>
-                                <option ${data === 'To Process' ? 'selected' : ''}>To Process</option>
-                            </select>
-                        `;
-                    }
-                },
-                {
-                    data: null,
-                    orderable: false,
-                    render: function (data, type, row) {
-                        return `
-                            <button class="btn btn-sm btn-warning edit-btn" data-id="${row.id}">Edit</button>
-                            <button class="btn btn-sm btn-danger delete-btn" data-id="${row.id}">Delete</button>
-                        `;
-                    }
+    if ($.fn.DataTable.isDataTable('#orders-table')) {
+        $('#orders-table').DataTable().ajax.reload(null, false);
+        return;
+    }
+    $('#orders-table').DataTable({
+        serverSide: true,
+        processing: true,
+        ordering: false,
+        searchDelay: 400,
+        ajax: ordersApiAjax(['id', 'order_number', 'item_name', 'billing_name', 'billing_phone', 'billing_street', 'billing_city', 'subtotal', 'shipping', 'total', 'discount_code', 'discount_amount', 'cod_amount', 'advance_delivery_charges', 'courier', 'shipping_status', 'status']),
+        columns: [
+            { data: 'id' },
+            { data: 'order_number' },
+            { data: 'item_name' },
+            { data: 'billing_name' },
+            { data: 'billing_phone' },
+            { data: 'billing_street' },
+            { data: 'billing_city' },
+            { data: 'subtotal' },
+            { data: 'shipping' },
+            { data: 'total' },
+            { data: 'discount_code' },
+            { data: 'discount_amount' },
+            { data: 'cod_amount' },
+            { data: 'advance_delivery_charges' },
+            { data: 'courier' },
+            { data: 'shipping_status' },
+            {
+                data: 'status',
+                render: function (data, type, row) {
+                    return `
+                        <select class="status-select form-control form-select-sm" data-id="${row.id}">
+                            <option ${data === 'Confirmed' ? 'selected' : ''}>Confirmed</option>
+                            <option ${data === 'Pending' ? 'selected' : ''}>Pending</option>
+                            <option ${data === 'Cancelled' ? 'selected' : ''}>Cancelled</option>
+                            <option ${data === 'Not Responding' ? 'selected' : ''}>Not Responding</option>
+                            <option ${data === 'To Process' ? 'selected' : ''}>To Process</option>
+                        </select>
+                    `;
                 }
-            ],
-            orderCellsTop: true,
-            fixedHeader: true,
-            initComplete: function () {
-                let api = this.api();
-                api.columns().every(function (index) {
-                    const header = $('thead tr.filters th').eq(index);
-
-                    if (index === 16) {
-                        const select = $('<select class="form-control form-select-sm status-filter"><option value="">All</option></select>')
-                            .appendTo(header.empty())
-                            .on('change', function () {
-                                api.column(index).search(this.value).draw();
-                            });
+            },
+            {
+                data: null,
+                orderable: false,
+                render: function (data, type, row) {
+                    return `
+                        <button class="btn btn-sm btn-warning edit-btn" data-id="${row.id}">Edit</button>
+                        <button class="btn btn-sm btn-danger delete-btn" data-id="${row.id}">Delete</button>
+                    `;
+                }
+            }
+        ],
+        orderCellsTop: true,
+        fixedHeader: true,
+        initComplete: function () {
+            let api = this.api();
+            api.columns().every(function (index) {
+                const header = $('thead tr.filters th').eq(index);
 
-                        this.data().unique().sort().each(function (d) {
-                            if (d) select.append(`<option value="${d}">${d}</option>`);
+                if (index === 16) {
+                    const select = $('<select class="form-control form-select-sm status-filter"><option value="">All</option></select>')
+                        .appendTo(header.empty())
+                        .on('change', function () {
+                            api.column(index).search(this.value).draw();
                         });
 
-                        select.select2({
-                            placeholder: 'Search status',
-                            width: '100%',
-                            minimumResultsForSearch: Infinity
-                        });
-                    } else {
-                        const input = header.find('input');
-                        if (input.length) {
-                            input.on('keyup change', function () {
-                                api.column(index).search(this.value).draw();
-                            });
-                        }
-                    }
-                });
+                    fillFilterOptions(select, ORDER_STATUSES);
 
-                // Initialize select2 on status columns
-                $('.status-select').select2({
-                    minimumResultsForSearch: -1,
-                    width: '100%',
-                    dropdownAutoWidth: true
-                });
-            }
-        });
+                    select.select2({
+                        placeholder: 'Search status',
+                        width: '100%',
+                        minimumResultsForSearch: Infinity
+                    });
+                } else {
+                    const input = header.find('input');
+                    if (input.length) {
+                        bindColumnInput(api, index, input);
+                    }
+                }
+            });
+        },
+        drawCallback: function () {
+            // rows are replaced on every server-side draw: initialize select2 on status columns
+            $('.status-select').select2({
+                minimumResultsForSearch: -1,
+                width: '100%',
+                dropdownAutoWidth: true
+            });
+        }
     });
 }
 
@@ -0,0 +1,48 @@
+// DataTables server-side adapter for /api/orders.
+// Moving one page forward/back reuses the keyset cursors from the previous
+// response; any other jump falls back to ?page=. Column searches are sent as
+// filters named after the column's `data` field, the global search as ?q=.
+function ordersApiAjax(fields) {
+    let last = null;
+    return function (dt, callback) {
+        const page = Math.floor(dt.start / dt.length) + 1;
+        const params = { fields: fields.join(','), per_page: dt.length };
+        dt.columns.forEach(function (c) {
+            if (c.data && c.search.value) params[c.data] = c.search.value;
+        });
+        if (dt.search.value) params.q = dt.search.value;
+
+        const key = JSON.stringify(params);
+        if (last && last.key === key && page === last.page + 1 && last.next_after_id) {
+            params.after_id = last.next_after_id;
+        } else if (last && last.key === key && page === last.page - 1 && last.prev_before_id) {
+            params.before_id = last.prev_before_id;
+        } else {
+            params.page = page;
+        }
+
+        $.get('/api/orders', params, function (res) {
+            last = { key: key, page: page, next_after_id: res.next_after_id, prev_before_id: res.prev_before_id };
+            callback({ draw: dt.draw, data: res.rows, recordsTotal: res.total, recordsFiltered: res.total });
+        });
+    };
+}
+
+// Fill a header <select> filter with fixed options (a server-side table only holds one page)
+function fillFilterOptions(select, options) {
+    options.forEach(function (d) { select.append(`<option value="${d}">${d}</option>`); });
+}
+
+// Debounced column search for header <input> filters
+function bindColumnInput(api, index, input) {
+    let timer = null;
+    input.on('keyup change', function () {
+        const value = this.value;
+        clearTimeout(timer);
+        timer = setTimeout(function () { api.column(index).search(value).draw(); }, 400);
+    });
+}
+
+const ORDER_STATUSES = ['Confirmed', 'Pending', 'Cancelled', 'Not Responding', 'To Process'];
+const SHIPPING_STATUSES = ['Shipped', 'To Process', 'Failed Delivery', 'Returned', 'Delivered'];
+const COURIERS = ['Daewoo', 'Daraz'];
@@ -1,72 +1,74 @@
 function loadOrders() {
-    $.get('/get_orders', function(data) {
-        $('#support-table').DataTable({
-            destroy: true,
-            data: data,
-            columns: [
-                { data: 'id' },
-                { data: 'order_number' },
-                { data: 'item_name' },
-                { data: 'billing_name' },
-                { data: 'billing_phone' },
-                { data: 'billing_street' },
-                { data: 'billing_city' },
-                {
-                    data: 'status',
-                    render: function (data, type, row) {
-                        return `
-                            <select class="status-select form-control form-select-sm" data-id="${row.id}">
-                                <option ${data === 'Confirmed' ? 'selected' : ''}>Confirmed</option>
-                                <option ${data === 'Pending' ? 'selected' : ''}>Pending</option>
-                                <option ${data === 'Cancelled' ? 'selected' : ''}>Cancelled</option>
-                                <option ${data === 'Not Responding' ? 'selected' : ''}>Not Responding</option>
-                                <option ${data === 'To Process' ? 'selected' : ''}>To Process</option>
-                            </select>
-                        `;
-                    }
+    if ($.fn.DataTable.isDataTable('#support-table')) {
+        $('#support-table').DataTable().ajax.reload(null, false);
+        return;
+    }
+    $('#support-table').DataTable({
+        serverSide: true,
+        processing: true,
+        ordering: false,
+        searchDelay: 400,
+        ajax: ordersApiAjax(['id', 'order_number', 'item_name', 'billing_name', 'billing_phone', 'billing_street', 'billing_city', 'status']),
+        columns: [
+            { data: 'id' },
+            { data: 'order_number' },
+            { data: 'item_name' },
+            { data: 'billing_name' },
+            { data: 'billing_phone' },
+            { data: 'billing_street' },
+            { data: 'billing_city' },
+            {
+                data: 'status',
+                render: function (data, type, row) {
+                    return `
+                        <select class="status-select form-control form-select-sm" data-id="${row.id}">
+                            <option ${data === 'Confirmed' ? 'selected' : ''}>Confirmed</option>
+                            <option ${data === 'Pending' ? 'selected' : ''}>Pending</option>
+                            <option ${data === 'Cancelled' ? 'selected' : ''}>Cancelled</option>
+                            <option ${data === 'Not Responding' ? 'selected' : ''}>Not Responding</option>
+                            <option ${data === 'To Process' ? 'selected' : ''}>To Process</option>
+                        </select>
+                    `;
                 }
-            ],
-            orderCellsTop: true,
-            fixedHeader: true,
-            initComplete: function () {
-                let api = this.api();
-                api.columns().every(function (index) {
-                    const header = $('thead tr.filters th').eq(index);
-
-                    if (index === 7) {
-                        const select = $('<select class="form-control form-select-sm status-filter"><option value="">All</option></select>')
-                            .appendTo(header.empty())
-                            .on('change', function () {
-                                api.column(index).search(this.value).draw();
-                            });
+            }
+        ],
+        orderCellsTop: true,
+        fixedHeader: true,
+        initComplete: function () {
+            let api = this.api();
+            api.columns().every(function (index) {
+                const header = $('thead tr.filters th').eq(index);
 
-                        this.data().unique().sort().each(function (d) {
-                            if (d) select.append(`<option value="${d}">${d}</option>`);
+                if (index === 7) {
+                    const select = $('<select class="form-control form-select-sm status-filter"><option value="">All</option></select>')
+                        .appendTo(header.empty())
+                        .on('change', function () {
+                            api.column(index).search(this.value).draw();
                         });
 
-                        select.select2({
-                            placeholder: 'Search status',
-                            width: '100%',
-                            minimumResultsForSearch: Infinity
-                        });
-                    } else {
-                        const input = header.find('input');
-                        if (input.length) {
-                            input.on('keyup change', function () {
-                                api.column(index).search(this.value).draw();
-                            });
-                        }
-                    }
-                });
+                    fillFilterOptions(select, ORDER_STATUSES);
 
-                // Initialize select2 on status columns
-                $('.status-select').select2({
-                    minimumResultsForSearch: -1,
-                    width: '100%',
-                    dropdownAutoWidth: true
-                });
-            }
-        });
+                    select.select2({
+                        placeholder: 'Search status',
+                        width: '100%',
+                        minimumResultsForSearch: Infinity
+                    });
+                } else {
+                    const input = header.find('input');
+                    if (input.length) {
+                        bindColumnInput(api, index, input);
+                    }
+                }
+            });
+        },
+        drawCallback: function () {
+            // rows are replaced on every server-side draw: initialize select2 on status columns
+            $('.status-select').select2({
+                minimumResultsForSearch: -1,
+                width: '100%',
+                dropdownAutoWidth: true
+            });
+        }
     });
 }
 
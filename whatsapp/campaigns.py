@@ -0,0 +1,497 @@
+import json
+import threading
+import time
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from celery_app import celery
+from config import (CAMPAIGN_FLUSH_SIZE, CAMPAIGN_FLUSH_INTERVAL, CAMPAIGN_COOLDOWN_DAYS, CAMPAIGN_MAX_ATTEMPTS,
+                    CAMPAIGN_STALE_AFTER)
+from logger import get_logger
+from models.db import pooled_connection
+from models.export import stream_rows
+from models.message_templates import store as template_store
+from models import stats
+from whatsapp import sender
+from whatsapp.transports import get_transport
+
+logger = get_logger("campaigns")
+
+
+class MessageType(NamedTuple):
+    where: str
+    # SET clause applied to the order rows of each successful send
+    update_after_send: Optional[str] = None
+    # True: one message per customer and order; False: one per customer
+    per_order: bool = True
+    # days the same type is not sent to a customer again (0: no cooldown)
+    cooldown_days: int = 0
+
+
+# The campaign types that can be sent, with their audience and what a send changes.
+# Only the message layout is data (the 'Message types' rows of message_templates,
+# models/renderer.py); a new type needs an entry here as well as an Active layout row,
+# and a layout without an entry here cannot be sent.
+MESSAGE_TYPES = {
+    'confirmation': MessageType("WHERE status IN ('To Process', 'Not Responding')", "status = 'Confirmed'"),
+    'return': MessageType("WHERE shipping_status = 'Failed Delivery'"),
+    'cancelled': MessageType("WHERE status = 'Cancelled'", per_order=False, cooldown_days=CAMPAIGN_COOLDOWN_DAYS),
+    'valued': MessageType("WHERE customer_type = 'Valued'", per_order=False, cooldown_days=CAMPAIGN_COOLDOWN_DAYS),
+    'tracking': MessageType("WHERE tracking_number != '' AND shipping_status = 'Shipped'"),
+}
+
+# Suppressed customers are skipped with primary key lookups on campaign_suppressions;
+# message_type '*' is an opt-out from every type.
+RECIPIENT_COLUMNS = ("o.id, o.customer_key, o.order_number, o.billing_name, o.item_name, o.billing_phone, "
+                     "o.phone_e164, o.total, o.tracking_number")
+
+SUPPRESSED_SQL = """EXISTS (
+          SELECT 1 FROM campaign_suppressions s
+          WHERE s.customer_key = o.customer_key
+            AND s.message_type IN (%s, '*')
+            AND s.suppressed_until > NOW()
+      )"""
+
+RECIPIENTS_SQL = f"""
+    SELECT {RECIPIENT_COLUMNS}
+    FROM orders o
+    {{where}}
+      AND NOT {SUPPRESSED_SQL}
+    ORDER BY o.id
+"""
+
+# Dry runs (preview()) read every matched row, suppressed ones flagged, sorted so each
+# recipient's rows are adjacent: dedup then needs no more memory than one recipient.
+# Binary order, so keys that differ only in case (distinct in Python) never interleave.
+PREVIEW_SQL = f"""
+    SELECT {RECIPIENT_COLUMNS}, {SUPPRESSED_SQL} AS suppressed
+    FROM orders o
+    {{where}}
+    ORDER BY CAST(o.customer_key AS BINARY), {{order_key}} o.id
+"""
+
+SUPPRESS_SQL = """
+    INSERT INTO campaign_suppressions (customer_key, message_type, suppressed_until, reason)
+    VALUES (%s, %s, NOW() + INTERVAL %s DAY, %s)
+    ON DUPLICATE KEY UPDATE
+        suppressed_until = GREATEST(suppressed_until, VALUES(suppressed_until)), reason = VALUES(reason)
+"""
+
+
+def unique_recipients(users, per_order=True):
+    """
+    Collapse order rows to one recipient per customer_key (the normalized phone
+    when there is one), or per (customer_key, order) for order-specific types,
+    so an order's line items or a customer's repeat orders share one message.
+    The latest row supplies the message fields; `order_ids` lists every row
+    the send stands for.
+    """
+    targets = {}
+    for user in users:
+        key = (user['customer_key'], user['order_number']) if per_order else user['customer_key']
+        order_ids = targets[key]['order_ids'] if key in targets else []
+        order_ids.append(user['id'])
+        targets[key] = {**user, 'order_ids': order_ids}
+    return list(targets.values())
+
+
+def grouped_recipients(rows, per_order=True):
+    """
+    unique_recipients() over rows sorted by recipient (PREVIEW_SQL): yields
+    each recipient as soon as its last row has been read.
+    """
+    current, current_key = None, None
+    for row in rows:
+        key = (row['customer_key'], row['order_number']) if per_order else row['customer_key']
+        if current is not None and key == current_key:
+            current = {**row, 'order_ids': current['order_ids']}
+        else:
+            if current is not None:
+                yield current
+            current, current_key = {**row, 'order_ids': []}, key
+        current['order_ids'].append(row['id'])
+    if current is not None:
+        yield current
+
+
+# Recipient state (campaign_recipients) is written once when a campaign first
+# runs; a resumed run sends only what is still pending or failed.
+RECIPIENT_FIELDS = ('customer_key', 'order_number', 'billing_name', 'item_name', 'billing_phone', 'phone_e164',
+                    'total', 'tracking_number')
+
+INSERT_RECIPIENT_SQL = f"""
+    INSERT INTO campaign_recipients (campaign_id, order_ids, {', '.join(RECIPIENT_FIELDS)})
+    VALUES (%s, %s, {', '.join(['%s'] * len(RECIPIENT_FIELDS))})
+"""
+
+RESUMABLE_SQL = """
+    SELECT * FROM campaign_recipients
+    WHERE campaign_id = %s AND status IN ('pending', 'failed') AND attempts < %s
+    ORDER BY id
+"""
+
+# order ids per post-send UPDATE; only a resumed run re-applying earlier sends gets near it
+UPDATE_CHUNK = 1000
+
+RECOUNT_SQL = """
+    UPDATE campaigns SET
+        sent = (SELECT COUNT(*) FROM campaign_recipients WHERE campaign_id = %s AND status = 'sent'),
+        failed = (SELECT COUNT(*) FROM campaign_recipients WHERE campaign_id = %s AND status = 'failed'),
+        heartbeat_at = NOW()
+    WHERE id = %s
+"""
+
+
+def suppress(cursor, customer_key, message_type='*', days=36500, reason='opt-out'):
+    """Stop `message_type` (every type for '*') going to `customer_key` for `days` days."""
+    cursor.execute(SUPPRESS_SQL, (customer_key, message_type, days, reason))
+
+
+def create_campaign(conn, message_type, headless=False):
+    with conn.cursor() as c:
+        c.execute("INSERT INTO campaigns (message_type, headless, status) VALUES (%s, %s, 'queued')",
+                  (message_type, int(bool(headless))))
+        campaign_id = c.lastrowid
+    conn.commit()
+    return campaign_id
+
+
+def submit(conn, message_type, headless=False):
+    """Record a campaign and hand it to the worker; returns the campaign id."""
+    campaign_id = create_campaign(conn, message_type, headless)
+    run_campaign.delay(campaign_id)
+    return campaign_id
+
+
+def resume(conn, campaign_id):
+    """
+    Requeue a failed or interrupted campaign. The worker sends to recipients that
+    are still pending and retries failed ones (up to CAMPAIGN_MAX_ATTEMPTS tries);
+    recipients already reached are not messaged again. A 'running' campaign is
+    only taken over once its worker has not flushed (heartbeat_at) for
+    CAMPAIGN_STALE_AFTER seconds, so a live run is never sent twice. Returns
+    False if the campaign does not exist, finished or is still running.
+    """
+    with conn.cursor() as c:
+        resumed = c.execute("""
+            UPDATE campaigns SET status = 'queued', error = NULL, finished_at = NULL
+            WHERE id = %s
+              AND (status = 'failed'
+                   OR (status = 'running'
+                       AND COALESCE(heartbeat_at, started_at) < NOW() - INTERVAL %s SECOND))
+        """, (campaign_id, CAMPAIGN_STALE_AFTER))
+    conn.commit()
+    if resumed:
+        run_campaign.delay(campaign_id)
+    return bool(resumed)
+
+
+def get_campaign(conn, campaign_id, error_limit=50):
+    with conn.cursor() as c:
+        c.execute("SELECT * FROM campaigns WHERE id = %s", (campaign_id,))
+        campaign = c.fetchone()
+        if not campaign:
+            return None
+        c.execute("""
+            SELECT phone, order_number, error FROM campaign_errors
+            WHERE campaign_id = %s ORDER BY id LIMIT %s
+        """, (campaign_id, error_limit))
+        campaign['errors'] = c.fetchall()
+    campaign['sessions'] = json.loads(campaign.pop('session_stats') or '[]')
+
+    done = campaign['sent'] + campaign['failed']
+    started, finished = campaign.get('started_at'), campaign.get('finished_at')
+    campaign['remaining'] = max(campaign['total'] - done, 0)
+    campaign['elapsed_sec'] = round(((finished or datetime.now()) - started).total_seconds(), 1) if started else 0
+    campaign['percent'] = min(100, round(done * 100 / campaign['total'])) if campaign['total'] else 0
+    return campaign
+
+
+def send_rate(transport=None):
+    """(lanes, messages per minute over all of them) for `transport`; the rate is None when unlimited."""
+    lanes = (transport or get_transport()).lanes()
+    if not lanes or any(lane.limiter is None for lane in lanes):
+        return len(lanes), None
+    return len(lanes), sum(lane.limiter.rate for lane in lanes) * 60
+
+
+def preview_messages(message_type):
+    """
+    Dry run of a campaign, streamed: yields every matched recipient (deduped
+    as a real run would) with its rendered `text`, or `error` if rendering
+    failed. Suppressed recipients come through with `suppressed` set and no
+    text. Reads orders on a connection of its own with an unbuffered cursor;
+    nothing is written and no transport is used.
+    """
+    spec = MESSAGE_TYPES[message_type]
+    renderer = template_store.renderer(message_type)
+    sql = PREVIEW_SQL.format(where=spec.where, order_key="CAST(o.order_number AS BINARY)," if spec.per_order else "")
+    rows = stream_rows(sql, (message_type,))
+    next(rows)  # column names
+    for user in grouped_recipients(rows, spec.per_order):
+        user['suppressed'] = bool(user['suppressed'])
+        if not user['suppressed']:
+            try:
+                user['text'] = renderer.render(user)
+            except Exception as e:
+                user['error'] = str(e)[:300]
+        yield user
+
+
+class PreviewTotals:
+    """Running counts over preview_messages() and the send time they imply."""
+
+    def __init__(self, message_type):
+        self.message_type = message_type
+        self.order_rows = self.recipients = self.suppressed = self.errors = 0
+        self.chars = self.max_chars = 0
+
+    def add(self, user):
+        self.order_rows += len(user['order_ids'])
+        if user['suppressed']:
+            self.suppressed += 1
+            return
+        self.recipients += 1
+        if 'error' in user:
+            self.errors += 1
+        else:
+            self.chars += len(user['text'])
+            self.max_chars = max(self.max_chars, len(user['text']))
+
+    def summary(self, transport=None):
+        lanes, rate = send_rate(transport)
+        rendered = self.recipients - self.errors
+        return {
+            'message_type': self.message_type,
+            'order_rows': self.order_rows,
+            'recipients': self.recipients,
+            'suppressed': self.suppressed,
+            'render_errors': self.errors,
+            'avg_chars': round(self.chars / rendered) if rendered else 0,
+            'max_chars': self.max_chars,
+            'lanes': lanes,
+            'rate_per_min': rate,
+            'estimated_sec': round(self.recipients * 60 / rate) if rate else 0,
+        }
+
+
+PREVIEW_FIELDS = ('customer_key', 'order_number', 'billing_name', 'phone_e164', 'billing_phone', 'order_ids',
+                  'suppressed', 'text', 'error')
+
+
+def preview(message_type, page=1, per_page=20, transport=None):
+    """
+    PreviewTotals.summary() plus page `page` of the rendered messages (suppressed
+    recipients left out) for a campaign of `message_type`, in one pass.
+    """
+    totals = PreviewTotals(message_type)
+    first = (page - 1) * per_page
+    sample = []
+    for user in preview_messages(message_type):
+        if not user['suppressed'] and first <= totals.recipients < first + per_page:
+            sample.append({k: user.get(k) for k in PREVIEW_FIELDS})
+        totals.add(user)
+    return {**totals.summary(transport), 'page': page, 'per_page': per_page, 'sample': sample}
+
+
+def _set_status(campaign_id, status, **fields):
+    sets = ", ".join(["status = %s"] + [f"{k} = %s" for k in fields])
+    with pooled_connection() as conn:
+        with conn.cursor() as c:
+            c.execute(f"UPDATE campaigns SET {sets} WHERE id = %s", (status, *fields.values(), campaign_id))
+        conn.commit()
+
+
+class _Progress:
+    """
+    Each result is checkpointed on its campaign_recipients row straight away (one
+    primary key update), so a crash loses nothing. The heavier effects are
+    buffered between flushes and written on one pooled connection in one
+    transaction: the post-send update as a single `UPDATE orders ... WHERE id IN
+    (...)`, cooldowns, error rows and the campaign counters. Flushes happen every
+    CAMPAIGN_FLUSH_SIZE results or CAMPAIGN_FLUSH_INTERVAL seconds, whichever
+    comes first, and once more when the run ends (run_campaign calls flush() in a
+    finally block). The same transaction sets `applied` on the recipients it
+    covers, so a resumed run only re-applies sends whose flush was lost, never
+    ones already written (and perhaps changed by staff since).
+
+    The sender calls in from one thread per WhatsApp profile, so every entry
+    point holds `_lock`. Each flush also stores the per-profile send rates.
+    """
+
+    def __init__(self, campaign_id, message_type, size=CAMPAIGN_FLUSH_SIZE, interval=CAMPAIGN_FLUSH_INTERVAL):
+        self.campaign_id = campaign_id
+        self.message_type = message_type
+        self.spec = MESSAGE_TYPES[message_type]
+        self.metrics = {}
+        self._lock = threading.RLock()
+        self.size = size
+        self.interval = interval
+        self.sent_ids = []
+        self.sent_keys = []
+        self.sent_recipients = []
+        self.sent = 0
+        self.failures = []
+        self.flushed_at = time.monotonic()
+
+    def _checkpoint(self, recipient_id, status, error=None):
+        with pooled_connection() as conn:
+            with conn.cursor() as c:
+                c.execute("""
+                    UPDATE campaign_recipients
+                    SET status = %s, attempts = attempts + 1, error = %s, updated_at = NOW()
+                    WHERE id = %s
+                """, (status, error, recipient_id))
+            conn.commit()
+
+    def sent_one(self, user):
+        with self._lock:
+            self._checkpoint(user['id'], 'sent')
+            self.buffer_sent(user)
+            self._maybe_flush()
+
+    def buffer_sent(self, user):
+        self.sent_ids.extend(user['order_ids'])
+        self.sent_keys.append(user['customer_key'])
+        self.sent_recipients.append(user['id'])
+        self.sent += 1
+
+    def failed_one(self, user, error):
+        with self._lock:
+            self._checkpoint(user['id'], 'failed', error[:1000])
+            self.failures.append((self.campaign_id, user['phone_e164'] or user['billing_phone'],
+                                  user['order_number'], error[:1000]))
+            self._maybe_flush()
+
+    def _maybe_flush(self):
+        if (self.sent + len(self.failures) >= self.size
+                or time.monotonic() - self.flushed_at >= self.interval):
+            self.flush()
+
+    def flush(self, final=False):
+        with self._lock:
+            self._flush(final)
+
+    def _flush(self, final):
+        self.flushed_at = time.monotonic()
+        if not self.sent and not self.failures and not final:
+            return
+        updated = False
+        with pooled_connection() as conn:
+            with conn.cursor() as c:
+                if self.spec.update_after_send and self.sent_ids:
+                    for i in range(0, len(self.sent_ids), UPDATE_CHUNK):
+                        ids = self.sent_ids[i:i + UPDATE_CHUNK]
+                        where = "WHERE id IN (" + ", ".join(["%s"] * len(ids)) + ")"
+                        before = stats.snapshot(c, where, ids)
+                        c.execute(f"UPDATE orders SET {self.spec.update_after_send} {where}", ids)
+                        stats.apply_changes(c, before, stats.snapshot(c, where, ids))
+                    updated = True
+                if self.spec.cooldown_days and self.sent_keys:
+                    c.executemany(SUPPRESS_SQL, [(k, self.message_type, self.spec.cooldown_days, 'cooldown')
+                                                 for k in self.sent_keys])
+                for i in range(0, len(self.sent_recipients), UPDATE_CHUNK):
+                    ids = self.sent_recipients[i:i + UPDATE_CHUNK]
+                    c.execute("UPDATE campaign_recipients SET applied = 1 WHERE id IN ("
+                              + ", ".join(["%s"] * len(ids)) + ")", ids)
+                if self.failures:
+                    c.executemany("""
+                        INSERT INTO campaign_errors (campaign_id, phone, order_number, error) VALUES (%s, %s, %s, %s)
+                    """, self.failures)
+                c.execute(RECOUNT_SQL, (self.campaign_id, self.campaign_id, self.campaign_id))
+                if self.metrics:
+                    c.execute("UPDATE campaigns SET session_stats = %s WHERE id = %s",
+                              (json.dumps([m.snapshot() for m in self.metrics.values()]), self.campaign_id))
+            conn.commit()
+        self.sent_ids, self.sent_keys, self.sent_recipients, self.sent, self.failures = [], [], [], 0, []
+        if updated:
+            stats.invalidate()
+
+
+def _load_recipients(c, campaign_id, message_type):
+    """
+    Recipients still to send. On the first run they are selected from orders and
+    stored as pending; on a resumed run they come from campaign_recipients.
+    Returns (recipients, total, sent_before) where sent_before lists the ones
+    reached by earlier runs whose post-send effects were never flushed.
+    """
+    c.execute("SELECT COUNT(*) AS n FROM campaign_recipients WHERE campaign_id = %s", (campaign_id,))
+    total = c.fetchone()['n']
+    if not total:
+        spec = MESSAGE_TYPES[message_type]
+        c.execute(RECIPIENTS_SQL.format(where=spec.where), (message_type,))
+        users = unique_recipients(c.fetchall(), spec.per_order)
+        c.executemany(INSERT_RECIPIENT_SQL, [
+            (campaign_id, json.dumps(u['order_ids']), *(u[f] for f in RECIPIENT_FIELDS)) for u in users
+        ])
+        total = len(users)
+        sent_before = []
+    else:
+        c.execute("""
+            SELECT id, customer_key, order_ids FROM campaign_recipients
+            WHERE campaign_id = %s AND status = 'sent' AND applied = 0
+        """, (campaign_id,))
+        sent_before = c.fetchall()
+    c.execute(RESUMABLE_SQL, (campaign_id, CAMPAIGN_MAX_ATTEMPTS))
+    recipients = c.fetchall()
+    for r in recipients + sent_before:
+        r['order_ids'] = json.loads(r['order_ids'])
+    return recipients, total, sent_before
+
+
+@celery.task(name='campaigns.run')
+def run_campaign(campaign_id):
+    """
+    Send a queued campaign, checkpointing every recipient. A resumed campaign
+    (see resume()) picks up the recipients left pending or failed.
+    """
+    with pooled_connection() as conn:
+        with conn.cursor() as c:
+            # claim it: a duplicate delivery of the task finds it no longer queued
+            claimed = c.execute("""
+                UPDATE campaigns SET status = 'running', started_at = COALESCE(started_at, NOW()), heartbeat_at = NOW()
+                WHERE id = %s AND status = 'queued'
+            """, (campaign_id,))
+        if not claimed:
+            conn.rollback()
+            logger.warning(f"Campaign {campaign_id} is not queued, skipping")
+            return
+        # committed on its own so a failed recipient load leaves a 'failed' (resumable)
+        # campaign rather than rolling back to 'queued' with no task left to run it
+        conn.commit()
+        try:
+            with conn.cursor() as c:
+                c.execute("SELECT * FROM campaigns WHERE id = %s", (campaign_id,))
+                campaign = c.fetchone()
+                message_type = campaign['message_type']
+                users, total, sent_before = _load_recipients(c, campaign_id, message_type)
+                c.execute("UPDATE campaigns SET total = %s WHERE id = %s", (total, campaign_id))
+            conn.commit()
+        except Exception as e:
+            logger.exception(f"Campaign {campaign_id} failed to load its recipients")
+            conn.rollback()
+            with conn.cursor() as c:
+                c.execute("UPDATE campaigns SET status = 'failed', finished_at = NOW(), error = %s WHERE id = %s",
+                          (str(e)[:1000], campaign_id))
+            conn.commit()
+            return
+
+    progress = _Progress(campaign_id, message_type)
+    if sent_before:
+        logger.info(f"Campaign {campaign_id} resuming: {len(sent_before)} sends to record, {len(users)} to go")
+        for user in sent_before:
+            progress.buffer_sent(user)
+    try:
+        try:
+            sender.send_whatsapp_generic(
+                message_type, users, headless=bool(campaign['headless']),
+                on_sent=progress.sent_one, on_failed=progress.failed_one, metrics=progress.metrics,
+            )
+        finally:
+            # messages already delivered must be recorded even if the browser died mid-run
+            progress.flush(final=True)
+        _set_status(campaign_id, 'done', finished_at=datetime.now())
+        logger.info(f"Campaign {campaign_id} ({message_type}) finished: {len(users)} recipients this run")
+    except Exception as e:
+        logger.exception(f"Campaign {campaign_id} failed")
+        _set_status(campaign_id, 'failed', finished_at=datetime.now(), error=str(e)[:1000])
@@ -0,0 +1,32 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    `rate` sends per second on average, with up to `burst` saved up while idle.
+
+    `acquire()` takes a token, sleeping until one is due, and returns the
+    seconds it waited. Callers queue up fairly: each one reserves the next free
+    slot under the lock and sleeps outside it.
+    """
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = burst
+        self._updated = clock()
+
+    def acquire(self):
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            self._sleep(wait)
+        return wait
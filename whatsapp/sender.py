@@ -0,0 +1,119 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Empty
+
+from logger import get_logger
+from models.message_templates import store as template_store
+from whatsapp.transports import get_transport, TransportUnavailable
+
+logger = get_logger("whatsapp")
+
+
+def render(user, message_type):
+    """The message for one recipient, from the current compiled `message_type` (models/renderer.py)."""
+    return template_store.renderer(message_type).render(user)
+
+
+class SessionMetrics:
+    """Sends, failures and time spent waiting on the rate limiter for one lane during one campaign."""
+
+    def __init__(self, label):
+        self.label = label
+        self.sent = 0
+        self.failed = 0
+        self.rate_wait = 0.0
+        self.error = None
+        self.started = time.monotonic()
+        self.finished = None
+
+    def snapshot(self):
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return {
+            'lane': self.label,
+            'sent': self.sent,
+            'failed': self.failed,
+            'elapsed_sec': round(elapsed, 1),
+            'per_minute': round(self.sent * 60 / elapsed, 2) if elapsed > 0 else 0.0,
+            'rate_wait_sec': round(self.rate_wait, 1),
+            'error': self.error,
+        }
+
+
+def _drain(lane, queue, message_type, headless, metrics, on_sent, on_failed, failed_numbers):
+    """Send to recipients from `queue` on one lane until it is empty or the lane dies."""
+    try:
+        with lane.acquire(headless) as deliver:
+            while True:
+                try:
+                    user = queue.get_nowait()
+                except Empty:
+                    return
+                if lane.limiter:
+                    metrics.rate_wait += lane.limiter.acquire()
+                phone = user.get('phone_e164') or user['billing_phone']
+                try:
+                    deliver(phone, render(user, message_type))
+                except Exception as e:
+                    if isinstance(e, TransportUnavailable) or not lane.healthy():
+                        # lane is gone: hand the recipient to the other lanes and stop this one
+                        queue.put(user)
+                        raise
+                    metrics.failed += 1
+                    failed_numbers.append(phone)
+                    logger.error(f"Send failed for {phone}: {e}")
+                    if on_failed:
+                        on_failed(user, str(e))
+                    continue
+                metrics.sent += 1
+                logger.debug(f"Sent {message_type} message to {phone} via {lane.label}")
+                if on_sent:
+                    on_sent(user)
+    except Exception as e:
+        metrics.error = str(e)[:300]
+        raise
+    finally:
+        metrics.finished = time.monotonic()
+
+
+def send_whatsapp_generic(message_type, users, headless=False, on_sent=None, on_failed=None, metrics=None,
+                          transport=None):
+    """
+    Send one `message_type` message to each of `users`, spread over every lane
+    of `transport` (default: WHATSAPP_TRANSPORT, one lane per WhatsApp Web
+    profile) in parallel, each paced by its own token bucket.
+    `on_sent(user)` / `on_failed(user, error)` are called after every recipient
+    (from the lane threads) so the caller can record progress; `metrics`, if
+    given, is filled with one SessionMetrics per lane. If a lane dies the others
+    take over its recipients; the call raises only when recipients are left
+    because every lane failed. Returns the failed numbers.
+    """
+    template_store.renderer(message_type)   # unknown type: fail before opening any lane
+    if not users:
+        # e.g. a resumed campaign with nothing left to send: don't start a browser for it
+        return []
+    transport = transport or get_transport()
+    queue = Queue()
+    for user in users:
+        queue.put(user)
+    lanes = transport.lanes()
+    active = lanes[:min(len(lanes), len(users))]
+    metrics = metrics if metrics is not None else {}
+    failed_numbers = []
+    errors = []
+    with ThreadPoolExecutor(max_workers=len(active), thread_name_prefix='whatsapp') as executor:
+        futures = []
+        for lane in active:
+            metrics[lane.label] = SessionMetrics(lane.label)
+            futures.append(executor.submit(_drain, lane, queue, message_type, headless, metrics[lane.label],
+                                           on_sent, on_failed, failed_numbers))
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"WhatsApp lane stopped: {e}")
+                errors.append(e)
+    for m in metrics.values():
+        logger.info(f"Lane {m.label} ({transport.name}): {m.snapshot()}")
+    if errors and not queue.empty():
+        raise errors[0]
+    return failed_numbers
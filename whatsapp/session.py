@@ -0,0 +1,118 @@
+import atexit
+import threading
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+from webdriver_manager.chrome import ChromeDriverManager
+
+from config import (WHATSAPP_PROFILE_DIR, WHATSAPP_EXTRA_PROFILE_DIRS, WHATSAPP_READY_TIMEOUT,
+                    WHATSAPP_RATE_PER_MIN, WHATSAPP_RATE_BURST)
+from logger import get_logger
+from whatsapp.ratelimit import TokenBucket
+
+logger = get_logger("whatsapp")
+
+WHATSAPP_URL = 'https://web.whatsapp.com'
+# present once WhatsApp Web has loaded and the profile is logged in
+CHAT_LIST = (By.ID, 'pane-side')
+COMPOSE_BOX = (By.XPATH, '//div[@contenteditable="true" and @data-tab="10"]')
+
+
+class SessionNotReady(Exception):
+    pass
+
+
+class DriverSession:
+    """
+    One long-lived, logged-in WhatsApp Web browser per profile directory.
+
+    `acquire()` hands the driver to one caller at a time (the Chrome profile can
+    only be driven by a single browser anyway). The browser is started on first
+    use, kept open between campaigns and only restarted when the health check
+    fails or the caller asks for a different headless mode. `limiter` paces the
+    messages sent from this profile's account.
+    """
+
+    def __init__(self, profile_dir=WHATSAPP_PROFILE_DIR, ready_timeout=WHATSAPP_READY_TIMEOUT,
+                 rate_per_min=WHATSAPP_RATE_PER_MIN, burst=WHATSAPP_RATE_BURST):
+        self.profile_dir = profile_dir
+        self.ready_timeout = ready_timeout
+        self.limiter = TokenBucket(rate_per_min / 60.0, burst)
+        self._lock = threading.Lock()
+        self._driver = None
+        self._headless = None
+        self._driver_path = None
+        self.starts = 0
+
+    def _start(self, headless):
+        if self._driver_path is None:
+            # resolves (and downloads if needed) chromedriver once per process
+            self._driver_path = ChromeDriverManager().install()
+        options = Options()
+        options.add_argument(f'--user-data-dir={self.profile_dir}')
+        options.add_argument('--window-size=1920,1080')
+        if headless:
+            options.add_argument('--headless=new')
+        self._driver = webdriver.Chrome(service=Service(self._driver_path), options=options)
+        self._headless = headless
+        self.starts += 1
+        try:
+            self._driver.get(WHATSAPP_URL)
+            WebDriverWait(self._driver, self.ready_timeout).until(EC.presence_of_element_located(CHAT_LIST))
+        except TimeoutException:
+            self._quit()
+            raise SessionNotReady(
+                f"WhatsApp Web not ready after {self.ready_timeout}s; log in by scanning the QR code "
+                f"with headless mode off")
+        logger.info(f"WhatsApp Web session {self.profile_dir} ready (start #{self.starts}, headless={headless})")
+
+    def _quit(self):
+        if self._driver is not None:
+            try:
+                self._driver.quit()
+            except WebDriverException:
+                pass
+        self._driver = None
+
+    def healthy(self):
+        """The browser answers, still has its main tab and the chat list is loaded."""
+        if self._driver is None:
+            return False
+        try:
+            self._driver.switch_to.window(self._driver.window_handles[0])
+            return bool(self._driver.find_elements(*CHAT_LIST))
+        except (WebDriverException, IndexError):
+            return False
+
+    @contextmanager
+    def acquire(self, headless=False):
+        with self._lock:
+            if self._driver is not None and self._headless != headless:
+                self._quit()
+            elif self._driver is not None and not self.healthy():
+                logger.warning(f"WhatsApp Web session {self.profile_dir} failed its health check, restarting")
+                self._quit()
+            if self._driver is None:
+                self._start(headless)
+            try:
+                yield self._driver
+            except WebDriverException:
+                # a dead browser or tab: start fresh next time
+                self._quit()
+                raise
+
+    def close(self):
+        with self._lock:
+            self._quit()
+
+
+# one per configured profile; a campaign sends from all of them in parallel
+sessions = [DriverSession(d) for d in [WHATSAPP_PROFILE_DIR, *WHATSAPP_EXTRA_PROFILE_DIRS]]
+for _s in sessions:
+    atexit.register(_s.close)
@@ -0,0 +1,232 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+
+from config import (WHATSAPP_TRANSPORT, WHATSAPP_API_URL, WHATSAPP_API_TOKEN, WHATSAPP_API_LANES,
+                    WHATSAPP_RATE_PER_MIN, WHATSAPP_RATE_BURST, WHATSAPP_STUB_FILE)
+from whatsapp.ratelimit import TokenBucket
+
+# seconds for a chat to open; numbers not on WhatsApp never show the compose box
+COMPOSE_TIMEOUT = 30
+# pause after pressing Enter so the message leaves before the next keys or the tab closes;
+# pacing between recipients is the lane's rate limiter
+KEY_SETTLE = 0.5
+HTTP_TIMEOUT = 30
+
+
+class TransportUnavailable(Exception):
+    """The lane cannot send anything right now (as opposed to one recipient failing)."""
+
+
+class Lane(ABC):
+    """
+    One independent sender (a browser profile, an API connection, ...). A campaign
+    runs one thread per lane; `acquire()` yields `deliver(phone, text)` for that
+    thread, `limiter` (None: unlimited) paces it, and `healthy()` tells a dead lane
+    from a single failed recipient.
+    """
+
+    label = 'lane'
+    limiter = None
+
+    @contextmanager
+    def acquire(self, headless=False):
+        yield self.deliver
+
+    @abstractmethod
+    def deliver(self, phone, text):
+        """Send `text` to `phone`; raise to fail the recipient, TransportUnavailable to stop the lane."""
+
+    def healthy(self):
+        return True
+
+
+class Transport(ABC):
+    """Delivers rendered messages over one or more lanes."""
+
+    name = 'transport'
+
+    @abstractmethod
+    def lanes(self):
+        """The lanes a campaign spreads its recipients over."""
+
+
+# --- WhatsApp Web through Selenium -------------------------------------------------
+
+class SeleniumLane(Lane):
+    def __init__(self, session):
+        self.session = session
+        self.label = session.profile_dir
+        self.limiter = session.limiter
+
+    @contextmanager
+    def acquire(self, headless=False):
+        with self.session.acquire(headless) as driver:
+            yield lambda phone, text: self._send_in_tab(driver, phone, text)
+
+    def deliver(self, phone, text):
+        # one-off send outside a campaign; campaigns keep the browser across sends through acquire()
+        with self.acquire() as send:
+            send(phone, text)
+
+    @staticmethod
+    def _send_in_tab(driver, phone, text):
+        from selenium.webdriver.common.keys import Keys
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+        from whatsapp.session import COMPOSE_BOX, WHATSAPP_URL
+
+        driver.execute_script("window.open(arguments[0], '_blank');",
+                              f"{WHATSAPP_URL}/send?phone={phone.lstrip('+')}")
+        driver.switch_to.window(driver.window_handles[-1])
+        try:
+            box = WebDriverWait(driver, COMPOSE_TIMEOUT).until(EC.element_to_be_clickable(COMPOSE_BOX))
+            box.click()
+            box.clear()
+            parts = text.split("\n\n")
+            msg1 = f"{parts[0].strip()} {parts[1].strip()}" if len(parts) > 1 else parts[0].strip()
+            msg2 = " ".join(p.strip() for p in parts[2:])
+            box.send_keys(msg1)
+            box.send_keys(Keys.ENTER)
+            time.sleep(KEY_SETTLE)
+            if msg2:
+                box.send_keys(msg2)
+                box.send_keys(Keys.ENTER)
+                time.sleep(KEY_SETTLE)
+        finally:
+            driver.close()
+            driver.switch_to.window(driver.window_handles[0])
+
+    def healthy(self):
+        return self.session.healthy()
+
+
+class SeleniumTransport(Transport):
+    """One lane per logged-in WhatsApp Web profile (whatsapp/session.py)."""
+
+    name = 'selenium'
+
+    def lanes(self):
+        from whatsapp.session import sessions
+        return [SeleniumLane(s) for s in sessions]
+
+
+# --- HTTP messaging API ------------------------------------------------------------
+
+class HttpLane(Lane):
+    def __init__(self, transport, index):
+        self.transport = transport
+        self.label = f"http-{index}"
+        self.limiter = TokenBucket(transport.rate_per_min / 60.0, transport.burst)
+
+    def deliver(self, phone, text):
+        self.transport.post(phone, text)
+
+
+class HttpTransport(Transport):
+    """
+    POSTs `{"to": "+923001234567", "text": "..."}` as JSON to `url` (a WhatsApp
+    Business API gateway or similar), with `Authorization: Bearer <token>` when a
+    token is set. 4xx/5xx answers fail the recipient; a connection error makes
+    the lane unavailable so the campaign stops and can be resumed.
+    """
+
+    name = 'http'
+
+    def __init__(self, url=WHATSAPP_API_URL, token=WHATSAPP_API_TOKEN, lanes=WHATSAPP_API_LANES,
+                 rate_per_min=WHATSAPP_RATE_PER_MIN, burst=WHATSAPP_RATE_BURST, timeout=HTTP_TIMEOUT):
+        if not url:
+            raise ValueError("WHATSAPP_API_URL is required for the http transport")
+        self.url = url
+        self.token = token
+        self.rate_per_min = rate_per_min
+        self.burst = burst
+        self.timeout = timeout
+        self._lanes = [HttpLane(self, i) for i in range(max(lanes, 1))]
+
+    def lanes(self):
+        return self._lanes
+
+    def post(self, phone, text):
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        body = json.dumps({'to': phone, 'text': text}).encode('utf-8')
+        request = urllib.request.Request(self.url, data=body, headers=headers, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"HTTP {e.code}: {e.read()[:200].decode('utf-8', 'replace')}")
+        except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+            raise TransportUnavailable(f"{self.url}: {e}")
+
+
+# --- stub for local runs and load tests ----------------------------------------------
+
+class StubLane(Lane):
+    def __init__(self, transport, index):
+        self.transport = transport
+        self.label = f"stub-{index}"
+
+    def deliver(self, phone, text):
+        self.transport.record(self.label, phone, text)
+
+
+class StubTransport(Transport):
+    """
+    Records messages instead of sending them, as fast as the caller produces
+    them: in memory (`sent`, the last `keep` messages) and, when `path` is set,
+    appended to that file as NDJSON. Unlimited rate, `lanes` parallel lanes.
+    """
+
+    name = 'stub'
+
+    def __init__(self, path=WHATSAPP_STUB_FILE, lanes=1, keep=1000):
+        self.path = path
+        self.keep = keep
+        self.sent = deque(maxlen=keep)
+        self.count = 0
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8') if path else None
+        self._lanes = [StubLane(self, i) for i in range(max(lanes, 1))]
+
+    def lanes(self):
+        return self._lanes
+
+    def record(self, lane, phone, text):
+        with self._lock:
+            self.count += 1
+            self.sent.append((lane, phone, text))
+            if self._file:
+                self._file.write(json.dumps({'lane': lane, 'to': phone, 'text': text}, ensure_ascii=False) + "\n")
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+TRANSPORTS = {'selenium': SeleniumTransport, 'http': HttpTransport, 'stub': StubTransport}
+
+_active = None
+
+
+def get_transport():
+    """The process-wide transport chosen by WHATSAPP_TRANSPORT, built on first use."""
+    global _active
+    if _active is None:
+        _active = TRANSPORTS[WHATSAPP_TRANSPORT]()
+    return _active
+
+
+def set_transport(transport):
+    """Replace the process-wide transport (benchmarks, local runs); returns the previous one."""
+    global _active
+    previous, _active = _active, transport
+    return previous